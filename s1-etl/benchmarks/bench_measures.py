@@ -0,0 +1,85 @@
+"""
+Compare the vectorized `melt_measures` with the original per-hour loop. Each
+implementation runs in a fresh process, and its peak memory is the growth of
+the peak RSS of the process during the call.
+
+    python benchmarks/bench_measures.py --sensors 1000 --days 60
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from functions import COLUMNS, KEYS, melt_measures  # noqa: E402
+from synthetic import synthetic_traffic  # noqa: E402
+
+
+def process_measures_loop(df):
+    # Original implementation, kept as the baseline
+    rdf = df[COLUMNS + KEYS]
+    ls = []
+    for key in KEYS:
+        k = key.split("-")[0]
+        xdf = rdf[COLUMNS + [key]].copy()
+        xdf["time"] = xdf.data.apply(lambda x: x + " " + k)
+        xdf["value"] = xdf[key]
+        ls.append(xdf[["time", "codice spira", "value"]])
+    return pd.concat(ls)
+
+
+IMPLEMENTATIONS = {"loop": process_measures_loop, "melt": melt_measures}
+
+
+def status(field):
+    # in bytes, from /proc: unlike ru_maxrss, it sees the Arrow buffers and
+    # can be reset
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+
+
+def measure(name, opts, queue):
+    df = synthetic_traffic(opts.sensors, opts.days)
+
+    # reset the peak RSS to the current RSS
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    base = status("VmRSS")
+    t0 = time.perf_counter()
+    out = IMPLEMENTATIONS[name](df)
+    elapsed = time.perf_counter() - t0
+    peak = status("VmHWM") - base
+    queue.put((elapsed, peak, out.memory_usage(deep=True).sum()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=60)
+    opts = parser.parse_args()
+
+    rows = opts.sensors * opts.days
+    print(f"input rows: {rows}, output rows: {rows * len(KEYS)}")
+
+    ctx = multiprocessing.get_context("spawn")
+    for name in IMPLEMENTATIONS:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=measure, args=(name, opts, queue))
+        proc.start()
+        elapsed, peak, size = queue.get()
+        proc.join()
+        print(
+            f"{name:>5}: {elapsed:8.3f}s  peak {peak / 2**20:8.1f} MiB  "
+            f"output {size / 2**20:8.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Local load test of the measures API: per-request latency of the original
+offset pagination against keyset pagination, the page cache and bulk pages,
+and of filtered queries for one sensor over one day.
+
+    python benchmarks/bench_serve.py --sensors 1000 --days 60 --requests 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from functions import BULK_PAGE_SIZE, init_context, melt_measures, serve  # noqa: E402
+from synthetic import synthetic_traffic  # noqa: E402
+
+
+def serve_offset(context, event):
+    # Original implementation, kept as the baseline
+    df = context.df
+    fields = event.fields
+    page = max(int(fields.get("page", 0)), 0)
+    pageSize = min(max(int(fields.get("size", 50)), 1), 100)
+    start = page * pageSize
+    end = min(start + pageSize, len(df))
+    json = df.iloc[start:end].to_json(orient="records", date_format="iso")
+    return {"data": json, "page": page, "size": pageSize, "total": len(df)}
+
+
+def make_context(df):
+    project = SimpleNamespace(
+        get_dataitem=lambda key: SimpleNamespace(key=key, as_df=lambda: df.copy())
+    )
+    context = SimpleNamespace(project=project)
+    init_context(context, "dataset-measures")
+    return context
+
+
+def sweep(fn, context, requests, size, cursor):
+    latencies = []
+    fields = {"size": str(size), "bulk": "true"}
+    for page in range(requests):
+        if not cursor:
+            fields["page"] = str(page)
+        t0 = time.perf_counter()
+        res = fn(context, SimpleNamespace(fields=dict(fields)))
+        latencies.append(time.perf_counter() - t0)
+        if cursor:
+            if res["next"] is None:
+                break
+            fields["cursor"] = res["next"]
+    return np.array(latencies) * 1000
+
+
+def sweep_filter(context, requests, seed=0):
+    rng = np.random.default_rng(seed)
+    codes = context.codes
+    days = np.unique(context.times.view("datetime64[ns]").astype("datetime64[D]"))
+    latencies = []
+    for _ in range(requests):
+        day = days[rng.integers(len(days))]
+        fields = {
+            "spira": codes[rng.integers(len(codes))],
+            "from": str(day),
+            "to": str(day + 1),
+            "size": "24",
+        }
+        t0 = time.perf_counter()
+        serve(context, SimpleNamespace(fields=fields))
+        latencies.append(time.perf_counter() - t0)
+    return np.array(latencies) * 1000
+
+
+def report(name, latencies, size):
+    p50, p99 = np.percentile(latencies, [50, 99])
+    rows = len(latencies) * size / (latencies.sum() / 1000)
+    print(
+        f"{name:>14}: p50 {p50:8.3f}ms  p99 {p99:8.3f}ms  "
+        f"{rows:12.0f} rows/s  ({len(latencies)} requests)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--requests", type=int, default=2000)
+    opts = parser.parse_args()
+
+    df = melt_measures(synthetic_traffic(opts.sensors, opts.days))
+    context = make_context(df)
+    print(f"rows: {len(df)}")
+
+    report("offset", sweep(serve_offset, context, opts.requests, 100, False), 100)
+    report("cursor", sweep(serve, context, opts.requests, 100, True), 100)
+    report("cursor cached", sweep(serve, context, opts.requests, 100, True), 100)
+    bulk = max(opts.requests * 100 // BULK_PAGE_SIZE, 1)
+    report(
+        "bulk",
+        sweep(serve, context, bulk, BULK_PAGE_SIZE, True),
+        BULK_PAGE_SIZE,
+    )
+    report("filter", sweep_filter(context, opts.requests), 24)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Latency of bounding-box and k-nearest queries over the sensor registry, for
+the index lookup alone and for the whole request including serialization.
+
+    python benchmarks/bench_spire.py --sensors 50000 --requests 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from functions import bbox, init_spire, nearest, registry, serve_spire  # noqa: E402
+from synthetic import synthetic_traffic  # noqa: E402
+
+
+def report(name, latencies):
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    print(f"{name:>10}: p50 {p50:8.3f}ms  p99 {p99:8.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=10)
+    opts = parser.parse_args()
+
+    df = registry(synthetic_traffic(opts.sensors, 1))
+    project = SimpleNamespace(
+        get_dataitem=lambda key: SimpleNamespace(as_df=lambda: df.copy())
+    )
+    context = SimpleNamespace(project=project)
+    t0 = time.perf_counter()
+    init_spire(context, "dataset-spire")
+    print(f"sensors: {len(df)}, index built in {time.perf_counter() - t0:.3f}s")
+
+    rng = np.random.default_rng(0)
+    lon_min, lon_max = df["longitudine"].min(), df["longitudine"].max()
+    lat_min, lat_max = df["latitudine"].min(), df["latitudine"].max()
+
+    # viewports of about 1km, points inside the city
+    latencies = {"bbox": [], "knn": [], "bbox serve": [], "knn serve": []}
+    for _ in range(opts.requests):
+        lon = rng.uniform(lon_min, lon_max)
+        lat = rng.uniform(lat_min, lat_max)
+        box = (lon, lat, lon + 0.012, lat + 0.009)
+
+        t0 = time.perf_counter()
+        bbox(context, *box)
+        latencies["bbox"].append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        nearest(context, lon, lat, opts.k)
+        latencies["knn"].append(time.perf_counter() - t0)
+
+        fields = {"bbox": ",".join(map(str, box))}
+        t0 = time.perf_counter()
+        serve_spire(context, SimpleNamespace(fields=fields))
+        latencies["bbox serve"].append(time.perf_counter() - t0)
+
+        fields = {"lon": str(lon), "lat": str(lat), "k": str(opts.k)}
+        t0 = time.perf_counter()
+        serve_spire(context, SimpleNamespace(fields=fields))
+        latencies["knn serve"].append(time.perf_counter() - t0)
+
+    for name, values in latencies.items():
+        report(name, values)
+
+
+if __name__ == "__main__":
+    main()
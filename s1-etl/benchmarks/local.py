@@ -0,0 +1,74 @@
+"""
+Local stand-ins for the platform objects used by the ETL functions, backed by
+files in a working directory.
+"""
+
+import os
+import shutil
+from types import SimpleNamespace
+
+import pandas as pd
+
+
+class LocalDataItem:
+    def __init__(self, path, key=None):
+        self.path = path
+        self.key = key or f"local://{os.path.abspath(path)}"
+        self.spec = SimpleNamespace(path=path)
+
+    def as_df(self, file_format=None, sep=None, **kwargs):
+        if file_format == "csv" or str(self.path).endswith(".csv"):
+            return pd.read_csv(self.path, sep=sep or ",", **kwargs)
+        return pd.read_parquet(self.path, **kwargs)
+
+    def download(self, destination=None, overwrite=False):
+        if destination is None:
+            return self.path
+        os.makedirs(destination, exist_ok=True)
+        if os.path.isdir(self.path):
+            shutil.copytree(self.path, destination, dirs_exist_ok=True)
+            return destination
+        return shutil.copy(self.path, destination)
+
+
+class LocalProject:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def get_dataitem(self, name):
+        for path in (
+            os.path.join(self.root, name),
+            os.path.join(self.root, f"{name}.parquet"),
+        ):
+            if os.path.exists(path):
+                return LocalDataItem(path)
+        raise KeyError(name)
+
+    def log_dataitem(self, name, kind="table", source=None, data=None):
+        if data is not None:
+            path = os.path.join(self.root, f"{name}.parquet")
+            data.to_parquet(path, index=False)
+        else:
+            path = os.path.join(self.root, name)
+            shutil.rmtree(path, ignore_errors=True)
+            shutil.copytree(source, path)
+        return LocalDataItem(path)
+
+
+class LocalContext(SimpleNamespace):
+    """
+    Serving context: holds the project and the attributes set by init functions
+    """
+
+    def __init__(self, project):
+        super().__init__(project=project)
+
+    @staticmethod
+    def Response(body=None, headers=None, content_type=None, status_code=200):
+        return SimpleNamespace(
+            body=body,
+            headers=headers or {},
+            content_type=content_type,
+            status_code=status_code,
+        )
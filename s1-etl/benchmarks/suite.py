@@ -0,0 +1,228 @@
+"""
+Benchmark suite for the ETL functions on synthetic data, with local stand-ins
+for the platform. Each stage runs in a fresh process, reading the outputs of
+the previous stages from a working directory, and reports its throughput, its
+peak RSS and, for the API, latency percentiles.
+
+    python benchmarks/suite.py --sensors 1000 --days 365 --save baseline.json
+    python benchmarks/suite.py --sensors 1000 --days 365 --compare baseline.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import functions  # noqa: E402
+from local import LocalContext, LocalDataItem, LocalProject  # noqa: E402
+from synthetic import write_csv  # noqa: E402
+
+STAGES = {}
+
+# stages whose outputs a stage reads
+REQUIRES = {
+    "process_spire": ["downloader"],
+    "process_measures": ["downloader"],
+    "process_measures_parallel": ["downloader"],
+    "serve": ["downloader", "process_measures"],
+}
+
+# metrics where a larger value is a regression
+HIGHER_IS_WORSE = {"seconds", "peak_rss", "p50_ms", "p99_ms"}
+
+
+def stage(fn):
+    STAGES[fn.__name__] = fn
+    return fn
+
+
+def count_rows(path):
+    return sum(f.metadata.num_rows for f in pq.ParquetDataset(path).fragments)
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+@stage
+def downloader(project, opts):
+    url = LocalDataItem(os.path.join(project.root, "traffic.csv"))
+    df, elapsed = timed(functions.downloader, url)
+    project.log_dataitem("dataset", data=df)
+    return {"rows": len(df), "seconds": elapsed}
+
+
+@stage
+def stream_downloader(project, opts):
+    url = LocalDataItem(os.path.join(project.root, "traffic.csv"))
+    di, elapsed = timed(functions.stream_downloader, project, url)
+    return {"rows": count_rows(di.path), "seconds": elapsed}
+
+
+@stage
+def process_spire(project, opts):
+    di = project.get_dataitem("dataset")
+    df, elapsed = timed(functions.process_spire, di)
+    project.log_dataitem("dataset-spire", data=df)
+    return {"rows": count_rows(di.path), "seconds": elapsed}
+
+
+@stage
+def process_measures(project, opts):
+    di = project.get_dataitem("dataset")
+    df, elapsed = timed(functions.process_measures, di)
+    project.log_dataitem("dataset-measures", data=df)
+    return {"rows": len(df), "seconds": elapsed}
+
+
+@stage
+def process_measures_parallel(project, opts):
+    di = project.get_dataitem("dataset")
+    out, elapsed = timed(functions.process_measures_parallel, project, di, opts.workers)
+    return {"rows": count_rows(out.path), "seconds": elapsed}
+
+
+@stage
+def serve(project, opts):
+    context = LocalContext(project)
+    _, elapsed = timed(functions.init_context, context, "dataset-measures")
+
+    rng = np.random.default_rng(0)
+    total = len(context.times)
+    days = np.unique(context.times.view("datetime64[ns]").astype("datetime64[D]"))
+    latencies = []
+    for i in range(opts.requests):
+        if i % 2:
+            day = days[rng.integers(len(days))]
+            fields = {
+                "spira": context.codes[rng.integers(len(context.codes))],
+                "from": str(day),
+                "to": str(day + 1),
+            }
+        else:
+            fields = {"page": str(rng.integers(total // 100)), "size": "100"}
+        t0 = time.perf_counter()
+        event = SimpleNamespace(fields=fields, headers={})
+        functions.serve(context, event)
+        latencies.append(time.perf_counter() - t0)
+
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    return {"rows": total, "seconds": elapsed, "p50_ms": p50, "p99_ms": p99}
+
+
+def run_stage(name, root, opts, queue):
+    work = os.path.join(root, "work", name)
+    os.makedirs(work, exist_ok=True)
+    os.chdir(work)
+    try:
+        metrics = STAGES[name](LocalProject(root), opts)
+    except Exception as e:
+        queue.put({"error": repr(e)})
+        raise
+    # the largest of this process and of its workers, if any
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    metrics["peak_rss"] = peak * 1024
+    queue.put(metrics)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return the metrics that got worse than the baseline by more than tolerance
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if not base:
+                continue
+            if metric == "rows_per_sec":
+                worse = value < base * (1 - tolerance)
+            elif metric in HIGHER_IS_WORSE:
+                worse = value > base * (1 + tolerance)
+            else:
+                continue
+            if worse:
+                regressions.append(f"{name}.{metric}: {base:.4g} -> {value:.4g}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--input", help="existing CSV export to use")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=len(os.sched_getaffinity(0)))
+    parser.add_argument("--stages", nargs="*", default=list(STAGES))
+    parser.add_argument("--save", help="write the results to a JSON file")
+    parser.add_argument("--compare", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    opts = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        csv = os.path.join(root, "traffic.csv")
+        if opts.input:
+            os.symlink(os.path.abspath(opts.input), csv)
+        else:
+            write_csv(csv, opts.sensors, opts.days)
+
+        stages = []
+        for name in opts.stages:
+            for dep in REQUIRES.get(name, []) + [name]:
+                if dep not in stages:
+                    stages.append(dep)
+
+        for name in stages:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=run_stage, args=(name, root, opts, queue))
+            proc.start()
+            metrics = queue.get()
+            proc.join()
+            if "error" in metrics:
+                sys.exit(f"{name} failed: {metrics['error']}")
+            metrics["rows_per_sec"] = metrics["rows"] / metrics["seconds"]
+            results[name] = metrics
+
+            line = (
+                f"{name:>26}: {metrics['rows']:>10} rows  {metrics['seconds']:8.3f}s  "
+                f"{metrics['rows_per_sec']:12.0f} rows/s  "
+                f"peak RSS {metrics['peak_rss'] / 2**20:8.1f} MiB"
+            )
+            if "p50_ms" in metrics:
+                line += (
+                    f"  p50 {metrics['p50_ms']:.3f}ms  p99 {metrics['p99_ms']:.3f}ms"
+                )
+            print(line)
+
+    if opts.save:
+        with open(opts.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if opts.compare:
+        with open(opts.compare) as f:
+            regressions = compare(results, json.load(f), opts.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Synthetic traffic data with the layout of the Bologna open-data export.
+
+    python benchmarks/synthetic.py --sensors 1000 --days 365 --output traffic.csv
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from functions import COLS, KEYS  # noqa: E402
+
+
+def synthetic_traffic(sensors=1000, days=60, start="2023-01-01", seed=0, missing=0.0):
+    """
+    Build a wide traffic table with the same layout as the Bologna open-data
+    export: one row per (day, sensor), the registry columns and 24 hour counts.
+    The registry only depends on `seed`, the counts also on `start`.
+    """
+    rng = np.random.default_rng(seed)
+    codes = np.array([f"{i // 100}.{i % 100} {i} 1 1" for i in range(sensors)])
+    dates = pd.date_range(start, periods=days, freq="D").strftime("%Y-%m-%d")
+
+    n = sensors * days
+    df = pd.DataFrame(
+        {
+            "data": np.repeat(dates.to_numpy(), sensors),
+            "codice spira": np.tile(codes, days),
+        }
+    )
+    lon = np.tile(rng.uniform(11.25, 11.45, sensors), days)
+    lat = np.tile(rng.uniform(44.45, 44.55, sensors), days)
+    registry = {
+        "longitudine": lon,
+        "latitudine": lat,
+        "Livello": 0,
+        "tipologia": "Spire",
+        "codice": np.tile(np.arange(sensors), days),
+        "codice arco": np.tile(np.arange(sensors) * 10, days),
+        "codice via": np.tile(np.arange(sensors) % 250, days),
+        "Nome via": np.tile(np.array([f"VIA {i % 250}" for i in range(sensors)]), days),
+        "stato": "A",
+        "direzione": np.tile(
+            np.array(["N", "S", "E", "O"])[np.arange(sensors) % 4], days
+        ),
+        "angolo": np.tile(rng.uniform(0, 360, sensors).round(1), days),
+    }
+    for col in COLS[1:-1]:
+        df[col] = registry[col]
+    df["geopoint"] = [f"{a:.6f}, {o:.6f}" for a, o in zip(lat, lon)]
+
+    rng = np.random.default_rng([seed, pd.Timestamp(start).toordinal()])
+    counts = rng.poisson(120, size=(n, len(KEYS))).astype(np.float64)
+    if missing > 0:
+        counts[rng.random(counts.shape) < missing] = np.nan
+    for i, key in enumerate(KEYS):
+        df[key] = counts[:, i] if missing > 0 else counts[:, i].astype(np.int64)
+    return df
+
+
+def write_csv(
+    path, sensors, days, start="2023-01-01", seed=0, missing=0.0, chunk_days=30
+):
+    """
+    Write a synthetic export as a ';' separated CSV, a few days at a time so
+    that large exports do not need to fit in memory
+    """
+    for offset in range(0, days, chunk_days):
+        df = synthetic_traffic(
+            sensors,
+            min(chunk_days, days - offset),
+            start=pd.Timestamp(start) + pd.Timedelta(days=offset),
+            seed=seed,
+            missing=missing,
+        )
+        df.to_csv(
+            path, sep=";", index=False, mode="a" if offset else "w", header=not offset
+        )
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--start", default="2023-01-01")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--missing", type=float, default=0.0)
+    parser.add_argument("--output", default="traffic.csv")
+    opts = parser.parse_args()
+
+    write_csv(opts.output, opts.sensors, opts.days, opts.start, opts.seed, opts.missing)
+    print(f"{opts.sensors * opts.days} rows written to {opts.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,24 @@
+import gzip
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+from digitalhub.utils.exceptions import EntityNotExistsError
 from digitalhub_runtime_python import handler
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 COLS = [
     "codice spira",
     "longitudine",
@@ -45,36 +63,548 @@ KEYS = [
 ]
 COLUMNS = ["data", "codice spira"]
 
+# Explicit column types for chunked reads, so every chunk gets the same schema
+SCHEMA = {
+    **{col: "string" for col in COLUMNS + COLS},
+    "longitudine": "float64",
+    "latitudine": "float64",
+    "angolo": "float64",
+    **{key: "float32" for key in KEYS},
+}
+CHUNK_SIZE = 100_000
+
+# Days before the watermark processed again by the incremental steps, as the
+# most recent days of the export may still be revised
+LOOKBACK_DAYS = 3
+
+# Column types of the partitions written by the incremental steps, so that
+# partitions written by different runs read back as one dataset
+SPIRE_TYPES = {col: SCHEMA[col] for col in COLS}
+MEASURES_TYPES = {"codice spira": "string", "value": "float32"}
+
+# serve pagination
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+BULK_PAGE_SIZE = 10_000
+# serialized pages kept by the page cache, in bytes
+PAGE_CACHE_BYTES = 16 * 2**20
+
+# bulk export
+EXPORT_BATCH_SIZE = 50_000
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# memory-mapped measures shared by the serving replicas of a node
+MMAP_DIR = os.environ.get("MEASURES_MMAP_DIR", "/tmp/measures")
+
 
 @handler(outputs=["dataset"])
 def downloader(url):
     return url.as_df(file_format="csv", sep=";")
 
 
+@handler(outputs=["dataset"])
+def stream_downloader(project, url, chunksize=CHUNK_SIZE):
+    """
+    Download the remote CSV to disk, then read it in fixed-size chunks and
+    write each one as a part of a Parquet dataset, so memory stays bounded
+    regardless of the file size. pandas reads http(s) URLs whole into memory,
+    hence the download.
+    """
+    source = url.download(destination="source/", overwrite=True)
+
+    local_path = "dataset/"
+    shutil.rmtree(local_path, ignore_errors=True)
+    os.makedirs(local_path)
+
+    reader = pd.read_csv(
+        source,
+        sep=";",
+        usecols=list(SCHEMA),
+        dtype=SCHEMA,
+        chunksize=int(chunksize),
+    )
+    with reader:
+        for i, chunk in enumerate(reader):
+            chunk.to_parquet(f"{local_path}part-{i:05d}.parquet", index=False)
+    shutil.rmtree("source/", ignore_errors=True)
+
+    return project.log_dataitem(name="dataset", kind="table", source=local_path)
+
+
+def registry(df):
+    """
+    Keep the first non-null registry columns of each sensor
+    """
+    return df[COLS].groupby(["codice spira"]).first().reset_index()[COLS]
+
+
 @handler(outputs=["dataset-spire"])
 def process_spire(di):
-    df = di.as_df()
-    return df.groupby(["codice spira"]).first().reset_index()[COLS]
+    return registry(di.as_df())
+
+
+def melt_measures(df):
+    """
+    Reshape the wide hourly table into (time, codice spira, value) rows.
+
+    Rows are emitted hour by hour, as in the original per-key loop, but in a
+    single vectorized pass: ``time`` is a real datetime, ``codice spira`` is
+    categorical and ``value`` is downcast to the smallest numeric dtype.
+    """
+    n = len(df)
+    days = pd.to_datetime(df["data"]).to_numpy(dtype="datetime64[ns]")
+    time = np.empty(n * len(KEYS), dtype="datetime64[ns]")
+    for i, key in enumerate(KEYS):
+        np.add(days, np.timedelta64(int(key[:2]), "h"), out=time[i * n : (i + 1) * n])
+
+    codes = pd.Categorical(df["codice spira"])
+    spire = pd.Categorical.from_codes(
+        np.tile(codes.codes, len(KEYS)), categories=codes.categories
+    )
+
+    # hour-major order, copying each hourly column once
+    values = np.concatenate([df[key].to_numpy() for key in KEYS])
+    if values.dtype.kind in "iu":
+        # smallest signed type holding the range, as pd.to_numeric(downcast=
+        # "integer") does, without its intermediate copies
+        lo, hi = (values.min(), values.max()) if len(values) else (0, 0)
+        for dtype in (np.int8, np.int16, np.int32, np.int64):
+            if np.iinfo(dtype).min <= lo and hi <= np.iinfo(dtype).max:
+                values = values.astype(dtype, copy=False)
+                break
+    else:
+        values = pd.to_numeric(values).astype(np.float32)
+
+    return pd.DataFrame(
+        {"time": time, "codice spira": spire, "value": values}, copy=False
+    )
 
 
 @handler(outputs=["dataset-measures"])
 def process_measures(di):
     df = di.as_df()
-    rdf = df[COLUMNS + KEYS]
-    ls = []
-    for key in KEYS:
-        k = key.split("-")[0]
-        xdf = rdf[COLUMNS + [key]]
-        xdf["time"] = xdf.data.apply(lambda x: x + " " + k)
-        xdf["value"] = xdf[key]
-        ls.append(xdf[["time", "codice spira", "value"]])
-    return pd.concat(ls)
-
-
-def init_context(context, dataitem):
-    di = context.project.get_dataitem(dataitem)
+    return melt_measures(df[COLUMNS + KEYS])
+
+
+@handler(outputs=["dataset-spire", "dataset-measures"])
+def process_all(di):
+    """
+    Build both the sensor registry and the measures from a single read
+    """
+    df = di.as_df()
+    return registry(df), melt_measures(df[COLUMNS + KEYS])
+
+
+def read_watermark(project, name):
+    """
+    Return the last `data` day processed into an output, None on the first run
+    """
+    try:
+        artifact = project.get_artifact(f"{name}-watermark")
+    except EntityNotExistsError:
+        return None
+    path = artifact.download(overwrite=True)
+    with open(path) as f:
+        return pd.Timestamp(json.load(f)["data"])
+
+
+def download_partitions(project, name, start):
+    """
+    Download the day partitions already logged for an output into a local
+    folder, without those of the days from `start` on, which are written
+    again. On the first incremental run (no watermark) the output starts empty.
+    """
+    local_path = f"{name}/"
+    shutil.rmtree(local_path, ignore_errors=True)
+    os.makedirs(local_path)
+    if start is None:
+        return local_path
+
+    project.get_dataitem(name).download(destination=local_path, overwrite=True)
+    for file in os.listdir(local_path):
+        day = file.removeprefix("part-").removesuffix(".parquet")
+        if day == "empty" or pd.Timestamp(day) >= start:
+            os.remove(os.path.join(local_path, file))
+    return local_path
+
+
+def log_partitions(project, name, local_path, df, days, watermark):
+    """
+    Write the rows of `df` as one partition per day of `days`, replacing the
+    partitions of those days, then log the output and persist the new
+    watermark. The watermark is saved last, so that the days of a failed run
+    are processed again by the next one
+    """
+    for day, part in df.groupby(days, sort=True):
+        part.to_parquet(f"{local_path}part-{day:%Y%m%d}.parquet", index=False)
+    if not os.listdir(local_path):
+        # an empty first output still gets a partition, holding its schema
+        df.to_parquet(f"{local_path}part-empty.parquet", index=False)
+
+    dataitem = project.log_dataitem(name=name, kind="table", source=local_path)
+
+    if pd.notna(watermark):
+        with open("watermark.json", "w") as f:
+            json.dump({"data": watermark.isoformat()}, f)
+        project.log_artifact(
+            name=f"{name}-watermark", kind="artifact", source="watermark.json"
+        )
+    return dataitem
+
+
+def newer_rows(project, name, df, lookback):
+    """
+    Keep only the rows of `df` from the first day to process: the day after
+    the output watermark, moved back by `lookback` days since the most recent
+    days may still be revised. Returns the rows, their days, that first day
+    (None on the first run) and the new watermark
+    """
+    days = pd.to_datetime(df["data"])
+    since = read_watermark(project, name)
+    if since is None:
+        return df, days, None, days.max()
+
+    start = since + pd.Timedelta(days=1 - int(lookback))
+    recent = days >= start
+    df, days = df[recent], days[recent]
+    watermark = max(since, days.max()) if len(days) else since
+    return df, days, start, watermark
+
+
+@handler(outputs=["dataset-spire"])
+def process_spire_incremental(project, di, lookback=LOOKBACK_DAYS):
+    """
+    Add to the sensor registry the sensors first seen in the days processed,
+    each in the partition of the day it was first seen
+    """
+    df, days, start, watermark = newer_rows(
+        project, "dataset-spire", di.as_df(), lookback
+    )
+    if df.empty and start is not None:
+        return project.get_dataitem("dataset-spire")
+
+    local_path = download_partitions(project, "dataset-spire", start)
+    spire = registry(df).astype(SPIRE_TYPES)
+    if os.listdir(local_path):
+        known = pd.read_parquet(local_path, columns=["codice spira"])
+        spire = spire[~spire["codice spira"].isin(known["codice spira"])]
+
+    first = days.groupby(df["codice spira"].astype("string")).min()
+    first_days = first.reindex(spire["codice spira"]).set_axis(spire.index)
+    return log_partitions(
+        project, "dataset-spire", local_path, spire, first_days, watermark
+    )
+
+
+@handler(outputs=["dataset-measures"])
+def process_measures_incremental(project, di, lookback=LOOKBACK_DAYS):
+    """
+    Reshape only the days processed and write them as one partition per day
+    """
+    df, days, start, watermark = newer_rows(
+        project, "dataset-measures", di.as_df(), lookback
+    )
+    if df.empty and start is not None:
+        return project.get_dataitem("dataset-measures")
+
+    local_path = download_partitions(project, "dataset-measures", start)
+    measures = melt_measures(df[COLUMNS + KEYS]).astype(MEASURES_TYPES)
+    return log_partitions(
+        project,
+        "dataset-measures",
+        local_path,
+        measures,
+        measures["time"].dt.floor("D"),
+        watermark,
+    )
+
+
+def melt_partition(path, start, stop, dtype, out):
+    """
+    Reshape rows [start, stop) of a memory-mapped Arrow file into a Parquet file
+    """
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    df = table.slice(start, stop - start).to_pandas()
+    melt_measures(df).astype({"value": dtype}).to_parquet(out, index=False)
+    return stop - start
+
+
+@handler(outputs=["dataset-measures"])
+def process_measures_parallel(project, di, workers=None, partitions=None, by="data"):
+    """
+    Reshape the measures in parallel: the input is split by date range
+    (by="data") or by sensor hash (by="spira") and each partition is reshaped
+    by a worker process straight into a part of a Parquet dataset
+    """
+    # the cores the pod may run on, not all those of the host
+    workers = int(workers or len(os.sched_getaffinity(0)))
+    partitions = int(partitions or workers * 2)
+
+    local_path = "dataset-measures/"
+    shutil.rmtree(local_path, ignore_errors=True)
+    os.makedirs(local_path)
+
+    df = di.as_df()[COLUMNS + KEYS]
+    if df.empty:
+        # nothing to split, a single part holds the schema
+        melt_measures(df).to_parquet(f"{local_path}part-00000.parquet", index=False)
+        return project.log_dataitem(
+            name="dataset-measures", kind="table", source=local_path
+        )
+
+    # all the partitions get the value dtype of the whole input
+    values = df[KEYS]
+    dtype = np.dtype(np.float32)
+    if values.notna().all().all() and (values % 1 == 0).all().all():
+        limits = pd.Series([values.min().min(), values.max().max()])
+        dtype = pd.to_numeric(limits, downcast="integer").dtype
+    del values
+
+    # sort the rows so that every partition is a contiguous slice
+    if by == "spira":
+        keys = pd.util.hash_pandas_object(df["codice spira"], index=False)
+        keys = (keys % partitions).to_numpy()
+        bounds = np.arange(partitions + 1)
+    else:
+        keys = pd.to_datetime(df["data"]).to_numpy()
+        days = np.unique(keys)
+        bounds = days[np.linspace(0, len(days), partitions + 1).astype(int)[:-1]]
+        bounds = np.append(bounds, days[-1] + np.timedelta64(1, "D"))
+    order = np.argsort(keys, kind="stable")
+    offsets = np.unique(np.searchsorted(keys[order], bounds))
+
+    # workers map the input instead of receiving pickled frames
+    path = "measures-input.arrow"
+    table = pa.Table.from_pandas(df.iloc[order], preserve_index=False)
+    del df
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    del table
+
+    # the workers only get a path and offsets, and a forked child would inherit
+    # the state of the pyarrow thread pool
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        jobs = [
+            pool.submit(
+                melt_partition,
+                path,
+                start,
+                stop,
+                dtype,
+                f"{local_path}part-{i:05d}.parquet",
+            )
+            for i, (start, stop) in enumerate(zip(offsets[:-1], offsets[1:]))
+        ]
+        for job in jobs:
+            job.result()
+    os.remove(path)
+
+    return project.log_dataitem(
+        name="dataset-measures", kind="table", source=local_path
+    )
+
+
+@handler(outputs=["rollup-daily", "rollup-weekly"])
+def process_rollups(di, spire):
+    """
+    Aggregate the hourly measures into daily and weekly totals per sensor,
+    joined to the street of each sensor from the registry
+    """
     df = di.as_df()
+    streets = spire.as_df()[["codice spira", "codice via", "Nome via"]]
+    streets["codice spira"] = streets["codice spira"].astype(str)
+
+    df["time"] = pd.to_datetime(df["time"]).dt.floor("D")
+    df["codice spira"] = df["codice spira"].astype("category")
+    daily = df.groupby(["time", "codice spira"], observed=True)["value"].sum()
+    daily = daily.reset_index()
+
+    # weeks start on monday
+    week = daily["time"] - pd.to_timedelta(daily["time"].dt.weekday, unit="D")
+    weekly = daily.groupby([week, "codice spira"], observed=True)["value"].sum()
+    weekly = weekly.reset_index()
+
+    def join(rollup):
+        rollup["codice spira"] = rollup["codice spira"].astype(str)
+        return rollup.merge(streets, on="codice spira", how="left")
+
+    return join(daily), join(weekly)
+
+
+def index_measures(df):
+    """
+    Sort the measures by (time, codice spira) and build the lookup indexes
+    """
+    # sensor codes are ranked lexically so that keys compare as integers
+    times = pd.to_datetime(df["time"]).to_numpy(dtype="datetime64[ns]").view("int64")
+    spire = df["codice spira"].astype(str)
+    ranks = pd.Categorical(spire, categories=np.sort(spire.unique()))
+    order = np.lexsort((ranks.codes, times))
+    times, spire = times[order], ranks.codes[order]
+
+    # per-sensor index: row positions grouped by sensor, each in time order
+    by_sensor = np.argsort(spire, kind="stable")
+
+    df = df.iloc[order].reset_index(drop=True)
+    df["time"] = times.view("datetime64[ns]")
+    return df, {
+        "times": times,
+        "spire": spire,
+        "codes": ranks.categories.to_numpy(),
+        "by_sensor": by_sensor,
+        "sensor_times": times[by_sensor],
+    }
+
+
+def write_measures(path, df, index):
+    """
+    Write the sorted measures and their indexes as an Arrow IPC file, with
+    int64 timestamps and dictionary-encoded sensor codes
+    """
+    table = pa.table(
+        {
+            "time": index["times"],
+            "codice spira": pa.DictionaryArray.from_arrays(
+                index["spire"].astype(np.int32), index["codes"]
+            ),
+            "value": df["value"].to_numpy(),
+            "by_sensor": index["by_sensor"],
+            "sensor_time": index["sensor_times"],
+        }
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def map_measures(path):
+    """
+    Memory-map an Arrow IPC measures file, returning the table and zero-copy
+    views of its indexes
+    """
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    spire = table.column("codice spira").chunk(0)
+    index = {
+        "times": table.column("time").chunk(0).to_numpy(),
+        "spire": spire.indices.to_numpy(),
+        "codes": spire.dictionary.to_numpy(zero_copy_only=False),
+        "by_sensor": table.column("by_sensor").chunk(0).to_numpy(),
+        "sensor_times": table.column("sensor_time").chunk(0).to_numpy(),
+    }
+    return table.select(["time", "codice spira", "value"]), index
+
+
+def init_context(context, dataitem, mmap=False):
+    di = context.project.get_dataitem(dataitem)
+
+    if mmap:
+        # the first replica on the node converts the dataset, the others
+        # only map the file and share its pages
+        name = hashlib.sha256(di.key.encode()).hexdigest()
+        path = os.path.join(MMAP_DIR, f"{name}.arrow")
+        if not os.path.exists(path):
+            write_measures(path, *index_measures(di.as_df()))
+        df, index = map_measures(path)
+    else:
+        df, index = index_measures(di.as_df())
+
+    counts = np.bincount(index["spire"], minlength=len(index["codes"]))
     setattr(context, "df", df)
+    setattr(context, "times", index["times"])
+    setattr(context, "spire", index["spire"])
+    setattr(context, "codes", index["codes"])
+    setattr(context, "by_sensor", index["by_sensor"])
+    setattr(context, "sensor_times", index["sensor_times"])
+    setattr(context, "sensor_offsets", np.concatenate([[0], np.cumsum(counts)]))
+    setattr(context, "pages", OrderedDict())
+    setattr(context, "pages_bytes", 0)
+    setattr(context, "version", di.key)
+
+
+def select(context, fields):
+    """
+    Return the row positions, times and sensor ranks matching the `spira`,
+    `from` (inclusive) and `to` (exclusive) filters, found by binary search
+    """
+    if "spira" in fields:
+        rank = np.searchsorted(context.codes, fields["spira"])
+        a = b = 0
+        if rank < len(context.codes) and context.codes[rank] == fields["spira"]:
+            a, b = context.sensor_offsets[rank], context.sensor_offsets[rank + 1]
+        rows = context.by_sensor[a:b]
+        times = context.sensor_times[a:b]
+        spire = np.full(b - a, rank, dtype=context.spire.dtype)
+    else:
+        rows = range(len(context.times))
+        times = context.times
+        spire = context.spire
+
+    lo, hi = 0, len(times)
+    if "from" in fields:
+        lo = np.searchsorted(times, pd.Timestamp(fields["from"]).value, side="left")
+    if "to" in fields:
+        hi = np.searchsorted(times, pd.Timestamp(fields["to"]).value, side="left")
+    hi = max(lo, hi)
+    return rows[lo:hi], times[lo:hi], spire[lo:hi]
+
+
+def cursor_at(context, pos):
+    """
+    Encode the (time, codice spira) key of the row at `pos` as a cursor
+    """
+    return f"{context.times[pos]},{context.codes[context.spire[pos]]}"
+
+
+def seek(context, times, spire, cursor):
+    """
+    Return the position in the selection of the first row after the cursor key
+    """
+    ns, spira = cursor.split(",", 1)
+    lo = np.searchsorted(times, int(ns), side="left")
+    hi = np.searchsorted(times, int(ns), side="right")
+    # rows whose sensor ranks before this bound sort before the cursor
+    bound = np.searchsorted(context.codes, spira, side="right")
+    return int(lo + np.searchsorted(spire[lo:hi], bound, side="left"))
+
+
+def take(context, rows):
+    """
+    Return the rows at the given positions as a DataFrame
+    """
+    df = context.df
+    if isinstance(df, pa.Table):
+        ds = df.take(np.asarray(rows, dtype=np.int64)).to_pandas()
+        ds["time"] = pd.to_datetime(ds["time"], unit="ns")
+        return ds
+    return df.iloc[rows]
+
+
+def render_page(context, key, rows):
+    """
+    Serialize the rows at the given positions, reusing recently served pages
+    up to PAGE_CACHE_BYTES of JSON
+    """
+    pages = context.pages
+    if key in pages:
+        pages.move_to_end(key)
+        return pages[key]
+
+    json = take(context, rows).to_json(orient="records", date_format="iso")
+    # the JSON is ASCII, one byte per character
+    if len(json) <= PAGE_CACHE_BYTES:
+        pages[key] = json
+        context.pages_bytes += len(json)
+        while context.pages_bytes > PAGE_CACHE_BYTES:
+            context.pages_bytes -= len(pages.popitem(last=False)[1])
+    return json
 
 
 def serve(context, event):
@@ -86,9 +616,13 @@ def serve(context, event):
     # mock REST api
     fields = event.fields
 
+    if "format" in fields:
+        return export(context, event)
+
     # pagination
     page = 0
-    pageSize = 50
+    pageSize = PAGE_SIZE
+    maxPageSize = MAX_PAGE_SIZE
 
     if "page" in fields:
         page = int(fields["page"])
@@ -96,23 +630,294 @@ def serve(context, event):
     if "size" in fields:
         pageSize = int(fields["size"])
 
+    # export clients may ask for larger pages
+    if fields.get("bulk", "false").lower() == "true":
+        maxPageSize = BULK_PAGE_SIZE
+
     if page < 0:
         page = 0
 
     if pageSize < 1:
         pageSize = 1
 
-    if pageSize > 100:
-        pageSize = 100
+    if pageSize > maxPageSize:
+        pageSize = maxPageSize
+
+    # filters
+    rows, times, spire = select(context, fields)
+
+    # keyset pagination: continue after the last row of the previous page
+    if "cursor" in fields:
+        start = seek(context, times, spire, fields["cursor"])
+        page = start // pageSize
+    else:
+        start = page * pageSize
+
+    total = len(rows)
+    start = min(start, total)
+    end = min(start + pageSize, total)
+
+    key = (fields.get("spira"), fields.get("from"), fields.get("to"), start, end)
+    json = render_page(context, key, rows[start:end])
+    cursor = cursor_at(context, rows[end - 1]) if end < total else None
+
+    return {
+        "data": json,
+        "page": page,
+        "size": pageSize,
+        "total": total,
+        "next": cursor,
+    }
+
+
+def content_encoding(headers):
+    """
+    Pick the response compression from the Accept-Encoding header
+    """
+    accepted = [
+        e.split(";")[0].strip() for e in headers.get("Accept-Encoding", "").split(",")
+    ]
+    if "zstd" in accepted and zstandard is not None:
+        return "zstd"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def open_sink(buf, encoding):
+    """
+    Wrap the response buffer with a streaming compressor
+    """
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor().stream_writer(buf, closefd=False)
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=buf, mode="wb")
+    return buf
+
+
+def export(context, event):
+    """
+    Export all the rows matching the filters as newline-delimited JSON or as
+    an Arrow IPC stream, written batch by batch into the compressed response
+    """
+    fields = event.fields
+    headers = event.headers or {}
+    fmt = fields["format"]
+    if fmt not in EXPORT_FORMATS:
+        return context.Response(
+            body=f"Unknown format {fmt}", content_type="text/plain", status_code=400
+        )
+
+    # the dataset version and the query identify the content
+    encoding = content_encoding(headers)
+    query = [fields.get(f) for f in ("spira", "from", "to")] + [fmt, encoding]
+    etag = hashlib.sha256(repr([context.version] + query).encode()).hexdigest()
+    response_headers = {"ETag": f'"{etag}"'}
+    if encoding is not None:
+        response_headers["Content-Encoding"] = encoding
+
+    tags = headers.get("If-None-Match", "").split(",")
+    tags = [t.strip().removeprefix("W/").strip('"') for t in tags]
+    if etag in tags or "*" in tags:
+        return context.Response(body="", headers=response_headers, status_code=304)
+
+    rows, _, _ = select(context, fields)
+    buf = io.BytesIO()
+    sink = open_sink(buf, encoding)
+    writer = None
+    # at least one batch, so that empty Arrow streams still carry the schema
+    for i in range(0, max(len(rows), 1), EXPORT_BATCH_SIZE):
+        ds = take(context, rows[i : i + EXPORT_BATCH_SIZE])
+        if fmt == "ndjson":
+            if ds.empty:
+                break
+            text = ds.to_json(orient="records", lines=True, date_format="iso")
+            sink.write(text.encode())
+        else:
+            batch = pa.RecordBatch.from_pandas(ds, preserve_index=False)
+            if writer is None:
+                writer = pa.ipc.new_stream(sink, batch.schema)
+            writer.write_batch(batch)
+    if writer is not None:
+        writer.close()
+    if sink is not buf:
+        sink.close()
+
+    return context.Response(
+        body=buf.getvalue(),
+        headers=response_headers,
+        content_type=EXPORT_FORMATS[fmt],
+        status_code=200,
+    )
+
+
+def init_rollups(context, daily, weekly):
+    """
+    Load the daily and weekly rollups, indexed by sensor and by street
+    """
+    rollups = {}
+    for period, key in (("day", daily), ("week", weekly)):
+        df = context.project.get_dataitem(key).as_df()
+        df["time"] = pd.to_datetime(df["time"])
+        df = df.sort_values("time", ignore_index=True)
+        streets = df.groupby(["time", "codice via", "Nome via"])["value"].sum()
+        streets = streets.reset_index()
+
+        for by, rollup, col in (
+            ("spira", df, "codice spira"),
+            ("via", streets, "codice via"),
+        ):
+            rollups[(period, by)] = {
+                str(k): group.reset_index(drop=True)
+                for k, group in rollup.groupby(col, sort=False)
+            }
+    setattr(context, "rollups", rollups)
+
+
+def serve_rollups(context, event):
+    # daily or weekly totals for one sensor (by=spira) or street (by=via)
+    fields = event.fields
+    period = fields.get("period", "day")
+    by = fields.get("by", "spira")
+    key = fields.get("key")
+
+    groups = context.rollups.get((period, by))
+    if groups is None or key is None:
+        return ""
+
+    ds = groups.get(key)
+    if ds is None:
+        ds = pd.DataFrame(columns=["time", "value"])
+
+    times = ds["time"].to_numpy(dtype="datetime64[ns]")
+    lo, hi = 0, len(ds)
+    if "from" in fields:
+        lo = np.searchsorted(times, np.datetime64(pd.Timestamp(fields["from"])))
+    if "to" in fields:
+        hi = np.searchsorted(times, np.datetime64(pd.Timestamp(fields["to"])))
+    ds = ds.iloc[lo : max(lo, hi)]
+    json = ds.to_json(orient="records", date_format="iso")
+
+    return {"data": json, "period": period, "by": by, "key": key, "total": len(ds)}
+
+
+# spatial grid over the sensor registry, in metres
+CELL_SIZE = 250.0
+EARTH_RADIUS = 6_371_000.0
 
-    start = page * pageSize
-    end = start + pageSize
-    total = len(df)
 
-    if end > total:
-        end = total
+def project_points(context, lon, lat):
+    """
+    Project lon/lat degrees to metres on a plane tangent at the registry centre
+    """
+    x = np.radians(np.asarray(lon, dtype=np.float64)) * context.scale
+    y = np.radians(np.asarray(lat, dtype=np.float64)) * EARTH_RADIUS
+    return x, y
 
-    ds = df.iloc[start:end]
-    json = ds.to_json(orient="records")
 
-    return {"data": json, "page": page, "size": pageSize, "total": total}
+def init_spire(context, dataitem):
+    """
+    Load the sensor registry and index the sensors on a regular grid
+    """
+    df = context.project.get_dataitem(dataitem).as_df()
+    df = df.dropna(subset=["longitudine", "latitudine"]).reset_index(drop=True)
+
+    lat0 = np.radians(df["latitudine"].mean())
+    setattr(context, "scale", EARTH_RADIUS * np.cos(lat0))
+    x, y = project_points(context, df["longitudine"], df["latitudine"])
+
+    # sensors sorted by cell, cells numbered row by row
+    x0, y0 = x.min(), y.min()
+    cols = (x - x0) // CELL_SIZE
+    rows = (y - y0) // CELL_SIZE
+    ncols = int(cols.max()) + 1
+    cells = (rows * ncols + cols).astype(np.int64)
+    order = np.argsort(cells, kind="stable")
+
+    # sensors are serialized once, requests only join their records
+    df = df.iloc[order].reset_index(drop=True)
+    records = [json.dumps(r) for r in json.loads(df.to_json(orient="records"))]
+    setattr(context, "records", np.array(records, dtype=object))
+    setattr(context, "x", x[order])
+    setattr(context, "y", y[order])
+    setattr(context, "cells", cells[order])
+    setattr(context, "origin", (x0, y0))
+    setattr(context, "shape", (int(rows.max()) + 1, ncols))
+
+
+def grid_window(context, x_min, y_min, x_max, y_max):
+    """
+    Return the positions of the sensors in the grid cells covering a window
+    """
+    x0, y0 = context.origin
+    nrows, ncols = context.shape
+    c0 = max(int((x_min - x0) // CELL_SIZE), 0)
+    c1 = min(int((x_max - x0) // CELL_SIZE), ncols - 1)
+    r0 = max(int((y_min - y0) // CELL_SIZE), 0)
+    r1 = min(int((y_max - y0) // CELL_SIZE), nrows - 1)
+    if c0 > c1 or r0 > r1:
+        return np.empty(0, dtype=np.int64)
+
+    # the cells of a grid row in [c0, c1] are contiguous in the sorted order
+    starts = np.arange(r0, r1 + 1) * ncols
+    lo = np.searchsorted(context.cells, starts + c0, side="left")
+    hi = np.searchsorted(context.cells, starts + c1, side="right")
+    return np.concatenate([np.arange(a, b) for a, b in zip(lo, hi)])
+
+
+def bbox(context, lon_min, lat_min, lon_max, lat_max):
+    """
+    Return the positions of the sensors inside a lon/lat bounding box
+    """
+    (x_min, x_max), (y_min, y_max) = project_points(
+        context, [lon_min, lon_max], [lat_min, lat_max]
+    )
+    pos = grid_window(context, x_min, y_min, x_max, y_max)
+    x, y = context.x[pos], context.y[pos]
+    return pos[(x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)]
+
+
+def nearest(context, lon, lat, k):
+    """
+    Return the positions of the k sensors nearest to a point and their
+    distances in metres, widening the searched window ring by ring
+    """
+    x, y = project_points(context, lon, lat)
+    k = min(k, len(context.cells))
+
+    # start from the distance to the grid, for points outside of it
+    x0, y0 = context.origin
+    nrows, ncols = context.shape
+    dx = max(x0 - x, 0, x - x0 - ncols * CELL_SIZE)
+    dy = max(y0 - y, 0, y - y0 - nrows * CELL_SIZE)
+    radius = np.hypot(dx, dy) + CELL_SIZE
+    while True:
+        pos = grid_window(context, x - radius, y - radius, x + radius, y + radius)
+        dist = np.hypot(context.x[pos] - x, context.y[pos] - y)
+        # sensors within `radius` are all inside the window
+        if np.count_nonzero(dist <= radius) >= k or len(pos) == len(context.cells):
+            best = np.argpartition(dist, k - 1)[:k]
+            best = best[np.argsort(dist[best])]
+            return pos[best], dist[best]
+        radius *= 2
+
+
+def serve_spire(context, event):
+    # sensors in a bounding box or nearest to a point
+    fields = event.fields
+    records = context.records
+
+    if "bbox" in fields:
+        lon_min, lat_min, lon_max, lat_max = map(float, fields["bbox"].split(","))
+        ls = records[bbox(context, lon_min, lat_min, lon_max, lat_max)]
+    elif "lon" in fields and "lat" in fields:
+        k = int(fields.get("k", 10))
+        if k < 1:
+            k = 1
+        pos, dist = nearest(context, float(fields["lon"]), float(fields["lat"]), k)
+        ls = [f'{r[:-1]}, "distanza": {d:.1f}}}' for r, d in zip(records[pos], dist)]
+    else:
+        return ""
+
+    json = "[" + ", ".join(ls) + "]"
+    return {"data": json, "total": len(ls)}
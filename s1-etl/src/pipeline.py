@@ -1,5 +1,45 @@
+import hashlib
+import re
+
 from digitalhub_runtime_hera.dsl import step
 from hera.workflows import DAG, Parameter, Workflow
+from hera.workflows import models as m
+
+# steps memoized by argo, in a ConfigMap of the workflow namespace. The
+# constants and memoize are the same in the pipeline.py of every scenario
+CACHE_CONFIG_MAP = "digitalhub-step-cache"
+CACHE_MAX_AGE = "720h"
+
+
+def memoize(*tasks, scope=None):
+    """
+    Let argo reuse the outputs of a previous run of each step when the function
+    version, the run arguments and the values of the inputs they refer to are
+    unchanged. A `scope` expression, such as the day the workflow was created,
+    is added to the keys of steps whose results also depend on something else,
+    like a remote file
+    """
+    for task in tasks:
+        args = task.template.args
+        key = hashlib.sha256("\0".join(args).encode()).hexdigest()[:16]
+        if scope:
+            key += "-" + scope
+        refs = re.findall(r"\{\{\s*([\w.-]+)\s*\}\}", " ".join(args))
+        if refs:
+            key += "-{{=sprig.sha256sum(" + ' + "," + '.join(refs) + ")}}"
+        task.template.memoize = m.Memoize(
+            key=key,
+            max_age=CACHE_MAX_AGE,
+            cache=m.Cache(config_map=m.LocalObjectReference(name=CACHE_CONFIG_MAP)),
+        )
+
+
+# day the workflow was created, as an argo expression
+TODAY = (
+    "{{workflow.creationTimestamp.Y}}"
+    "{{workflow.creationTimestamp.m}}"
+    "{{workflow.creationTimestamp.d}}"
+)
 
 
 def pipeline():
@@ -20,6 +60,7 @@ def pipeline():
                 },
                 function="process-spire",
                 inputs={"di": A.get_parameter("dataset")},
+                outputs=["dataset-spire"],
             )
             C = step(
                 template={
@@ -38,6 +79,124 @@ def pipeline():
                 function="api",
                 inputs={"dataitem": C.get_parameter("dataset-measures")},
             )
+            E = step(
+                template={
+                    "action": "job",
+                    "inputs": {
+                        "di": "{{inputs.parameters.di}}",
+                        "spire": "{{inputs.parameters.spire}}",
+                    },
+                },
+                function="process-rollups",
+                inputs={
+                    "di": C.get_parameter("dataset-measures"),
+                    "spire": B.get_parameter("dataset-spire"),
+                },
+                outputs=["rollup-daily", "rollup-weekly"],
+            )
+            F = step(
+                template={
+                    "action": "serve",
+                    "init_parameters": {
+                        "daily": "{{inputs.parameters.daily}}",
+                        "weekly": "{{inputs.parameters.weekly}}",
+                    },
+                },
+                function="api-rollups",
+                inputs={
+                    "daily": E.get_parameter("rollup-daily"),
+                    "weekly": E.get_parameter("rollup-weekly"),
+                },
+            )
+            G = step(
+                template={
+                    "action": "serve",
+                    "init_parameters": {"dataitem": "{{inputs.parameters.dataitem}}"},
+                },
+                function="api-spire",
+                inputs={"dataitem": B.get_parameter("dataset-spire")},
+            )
+            # the remote CSV grows every day under the same url
+            memoize(A, scope=TODAY)
+            memoize(B, C, E)
             A >> [B, C]
             C >> D
+            [B, C] >> E >> F
+            B >> G
+    return w
+
+
+def incremental_pipeline():
+    with Workflow(entrypoint="dag", arguments=Parameter(name="url")) as w:
+        with DAG(name="dag"):
+            A = step(
+                template={
+                    "action": "job",
+                    "inputs": {"url": "{{workflow.parameters.url}}"},
+                },
+                function="download-data",
+                outputs=["dataset"],
+            )
+            B = step(
+                template={
+                    "action": "job",
+                    "inputs": {"di": "{{inputs.parameters.di}}"},
+                },
+                function="process-spire-incremental",
+                inputs={"di": A.get_parameter("dataset")},
+            )
+            C = step(
+                template={
+                    "action": "job",
+                    "inputs": {"di": "{{inputs.parameters.di}}"},
+                },
+                function="process-measures-incremental",
+                inputs={"di": A.get_parameter("dataset")},
+                outputs=["dataset-measures"],
+            )
+            D = step(
+                template={
+                    "action": "serve",
+                    "init_parameters": {"dataitem": "{{inputs.parameters.dataitem}}"},
+                },
+                function="api",
+                inputs={"dataitem": C.get_parameter("dataset-measures")},
+            )
+            # not memoized: every run must read the days added to the remote CSV
+            A >> [B, C]
+            C >> D
+    return w
+
+
+def fused_pipeline():
+    with Workflow(entrypoint="dag", arguments=Parameter(name="url")) as w:
+        with DAG(name="dag"):
+            A = step(
+                template={
+                    "action": "job",
+                    "inputs": {"url": "{{workflow.parameters.url}}"},
+                },
+                function="download-data",
+                outputs=["dataset"],
+            )
+            B = step(
+                template={
+                    "action": "job",
+                    "inputs": {"di": "{{inputs.parameters.di}}"},
+                },
+                function="process-all",
+                inputs={"di": A.get_parameter("dataset")},
+                outputs=["dataset-measures"],
+            )
+            C = step(
+                template={
+                    "action": "serve",
+                    "init_parameters": {"dataitem": "{{inputs.parameters.dataitem}}"},
+                },
+                function="api",
+                inputs={"dataitem": B.get_parameter("dataset-measures")},
+            )
+            memoize(A, scope=TODAY)
+            memoize(B)
+            A >> B >> C
     return w
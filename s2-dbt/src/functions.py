@@ -0,0 +1,14 @@
+import pandas as pd
+from digitalhub_runtime_python import handler
+
+
+@handler(outputs=["departments"])
+def register_departments(project, departments):
+    """
+    Collect the tables of the department partitions into a single dataset
+    """
+    ls = []
+    for department in departments.split(","):
+        df = project.get_dataitem(f"department-{department}").as_df()
+        ls.append(df)
+    return pd.concat(ls, ignore_index=True)
@@ -1,5 +1,37 @@
+import hashlib
+import re
+
 from digitalhub_runtime_hera.dsl import step
 from hera.workflows import DAG, Parameter, Workflow
+from hera.workflows import models as m
+
+# steps memoized by argo, in a ConfigMap of the workflow namespace. The
+# constants and memoize are the same in the pipeline.py of every scenario
+CACHE_CONFIG_MAP = "digitalhub-step-cache"
+CACHE_MAX_AGE = "720h"
+
+
+def memoize(*tasks, scope=None):
+    """
+    Let argo reuse the outputs of a previous run of each step when the function
+    version, the run arguments and the values of the inputs they refer to are
+    unchanged. A `scope` expression, such as the day the workflow was created,
+    is added to the keys of steps whose results also depend on something else,
+    like a remote file
+    """
+    for task in tasks:
+        args = task.template.args
+        key = hashlib.sha256("\0".join(args).encode()).hexdigest()[:16]
+        if scope:
+            key += "-" + scope
+        refs = re.findall(r"\{\{\s*([\w.-]+)\s*\}\}", " ".join(args))
+        if refs:
+            key += "-{{=sprig.sha256sum(" + ' + "," + '.join(refs) + ")}}"
+        task.template.memoize = m.Memoize(
+            key=key,
+            max_age=CACHE_MAX_AGE,
+            cache=m.Cache(config_map=m.LocalObjectReference(name=CACHE_CONFIG_MAP)),
+        )
 
 
 def pipeline():
@@ -13,4 +45,40 @@ def pipeline():
                 },
                 function="transform-employees",
             )
+            memoize(A)
+    return w
+
+
+DEPARTMENTS = ["10", "20", "30", "40", "50", "60", "70", "80", "90", "100", "110"]
+MAX_PARALLEL = 4
+
+
+def partitioned_pipeline(departments=DEPARTMENTS, parallelism=MAX_PARALLEL):
+    with Workflow(
+        entrypoint="dag",
+        arguments=Parameter(name="employees"),
+        parallelism=parallelism,
+    ) as w:
+        with DAG(name="dag"):
+            transforms = [
+                step(
+                    template={
+                        "action": "transform",
+                        "inputs": {"employees": "{{workflow.parameters.employees}}"},
+                        "outputs": {"output_table": f"department-{department}"},
+                    },
+                    function=f"transform-employees-{department}",
+                )
+                for department in departments
+            ]
+            B = step(
+                template={
+                    "action": "job",
+                    "parameters": {"departments": ",".join(departments)},
+                },
+                function="register-departments",
+                outputs=["departments"],
+            )
+            memoize(*transforms)
+            transforms >> B
     return w
@@ -0,0 +1,82 @@
+"""
+Size and load time of the dataset artifact: the float64 frame written by
+`data_generator` against the compact float32/int8 one, loaded with
+`di.as_df()` and `drop` as before or with `load_dataset`. The breast cancer
+rows are resampled with noise to reach the requested size.
+
+    python benchmarks/bench_dataset.py --rows 1000000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from functions import data_generator, load_dataset  # noqa: E402
+
+
+def resample(df, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    out = df.iloc[rng.integers(len(df), size=rows)].reset_index(drop=True)
+    features = out.columns.drop("target")
+    noise = rng.normal(1, 0.01, size=(rows, len(features)))
+    out[features] = out[features].to_numpy() * noise.astype(
+        out[features].dtypes.iloc[0]
+    )
+    return out
+
+
+def dataitem(path):
+    def download(destination=None, overwrite=False):
+        return path
+
+    return SimpleNamespace(download=download, as_df=lambda: pd.read_parquet(path))
+
+
+def as_df(di):
+    # Original loading in train_model, kept as the baseline
+    df = di.as_df()
+    return df.drop(["target"], axis=1), df["target"]
+
+
+def timed(fn, di, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        X, y = fn(di)
+        best = min(best, time.perf_counter() - t0)
+    return best, X, y
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    opts = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        for compact in (False, True):
+            df = resample(data_generator(compact=compact), opts.rows)
+            path = os.path.join(root, f"dataset-{compact}.parquet")
+            df.to_parquet(path, index=False)
+            size = os.path.getsize(path) / 2**20
+            del df
+
+            name = "compact" if compact else "float64"
+            for loader, fn in (("as_df", as_df), ("load_dataset", load_dataset)):
+                elapsed, X, y = timed(fn, dataitem(path))
+                memory = (X.memory_usage(index=False).sum() + y.nbytes) / 2**20
+                print(
+                    f"{name:>8} {loader:>12}: file {size:7.1f}MB  "
+                    f"load {elapsed * 1000:8.1f}ms  in memory {memory:7.1f}MB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Startup benchmark of the classifier artifact: load time and memory of the
+in-band pickle against the out-of-band copy with memory-mapped arrays. Each
+load runs in a fresh process; the model is an SVC fitted on synthetic data,
+large enough for its support vectors to dominate the artifact.
+
+    python benchmarks/bench_load.py --rows 20000 --replicas 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pickle import dump
+
+import numpy as np
+from sklearn.datasets import make_classification
+from sklearn.svm import SVC
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from functions import BUFFERS_SUFFIX, dump_buffers, load_buffers  # noqa: E402
+
+
+def memory():
+    # Resident memory in MB, split into private (anon) and file-backed pages
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("RssAnon", "RssFile"):
+                fields[name] = int(value.split()[0]) / 1024
+    return fields["RssAnon"], fields["RssFile"]
+
+
+def load(path, fmt, X, queue):
+    anon, file = memory()
+    t0 = time.perf_counter()
+    if fmt == "pickle":
+        from pickle import load as pickle_load
+
+        with open(path, "rb") as f:
+            model = pickle_load(f)
+    else:
+        model = load_buffers(path)
+    elapsed = time.perf_counter() - t0
+    loaded = memory()
+    model.predict(X)
+    predicted = memory()
+    queue.put(
+        (
+            elapsed,
+            loaded[0] - anon,
+            loaded[1] - file,
+            predicted[0] - anon,
+            predicted[1] - file,
+        )
+    )
+
+
+def run(path, fmt, X, replicas):
+    # replicas load at the same time, as the pods of a deployment on one node
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    procs = [
+        ctx.Process(target=load, args=(path, fmt, X, queue)) for _ in range(replicas)
+    ]
+    for p in procs:
+        p.start()
+    results = np.array([queue.get() for _ in procs])
+    for p in procs:
+        p.join()
+    return results.mean(axis=0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--features", type=int, default=30)
+    parser.add_argument("--replicas", type=int, default=4)
+    opts = parser.parse_args()
+
+    X, y = make_classification(opts.rows, opts.features, flip_y=0.2, random_state=0)
+    model = SVC().fit(X, y)
+    print(f"support vectors: {model.support_vectors_.shape}")
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = {
+            "pickle": os.path.join(root, "model.pkl"),
+            "oob": os.path.join(root, "model" + BUFFERS_SUFFIX),
+        }
+        with open(paths["pickle"], "wb") as f:
+            dump(model, f, protocol=5)
+        dump_buffers(model, paths["oob"])
+
+        for fmt, path in paths.items():
+            size = os.path.getsize(path) / 2**20
+            load_s, anon, file, anon_p, file_p = run(path, fmt, X[:64], opts.replicas)
+            print(
+                f"{fmt:>6}: {size:7.1f}MB  load {load_s * 1000:8.2f}ms  "
+                f"after load anon {anon:6.1f}MB file {file:6.1f}MB  "
+                f"after predict anon {anon_p:6.1f}MB file {file_p:6.1f}MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Local load test of the classifier API: latency and throughput of requests of
+1 to 1024 rows, sent as a list of instances or as columns. Requests are
+served one at a time, as by a worker of the serving runtime, so larger
+requests are the way to amortize the per-call overhead of the SVC.
+
+    python benchmarks/bench_serve.py --requests 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pickle import dump
+from types import SimpleNamespace
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+from sklearn.svm import SVC
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from functions import data_generator, init_context, serve  # noqa: E402
+
+SIZES = [1, 4, 16, 64, 256, 1024]
+
+
+def train(root):
+    # Same model as train_model, without logging it
+    df = data_generator()
+    X = df.drop(["target"], axis=1)
+    y = df["target"]
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=0.20, random_state=5)
+    path = os.path.join(root, "breast_cancer_classifier.pkl")
+    with open(path, "wb") as f:
+        dump(SVC().fit(X_train, y_train), f, protocol=5)
+    return path, X.to_numpy()
+
+
+def make_context(path):
+    model = SimpleNamespace(download=lambda: path)
+    project = SimpleNamespace(get_model=lambda key: model)
+    context = SimpleNamespace(
+        project=project,
+        Response=lambda body=None, content_type=None, status_code=200, **kw: (
+            SimpleNamespace(body=body, status_code=status_code)
+        ),
+    )
+    init_context(context, "breast_cancer_classifier")
+    return context
+
+
+def payloads(X, columns, size, count, layout, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        rows = X[rng.integers(len(X), size=size)]
+        if layout == "columns":
+            body = {"columns": {c: rows[:, i].tolist() for i, c in enumerate(columns)}}
+        else:
+            body = {"instances": rows.tolist()}
+        yield SimpleNamespace(body=json.dumps(body).encode())
+
+
+def run(context, events):
+    latencies = []
+    t0 = time.perf_counter()
+    for event in events:
+        t = time.perf_counter()
+        res = serve(context, event)
+        latencies.append(time.perf_counter() - t)
+        assert isinstance(res, dict), res.body
+    return np.array(latencies) * 1000, time.perf_counter() - t0
+
+
+def report(name, size, latencies, elapsed):
+    p50, p99 = np.percentile(latencies, [50, 99])
+    rows = len(latencies) * size / elapsed
+    print(
+        f"{name:>9} {size:5d} rows: p50 {p50:8.3f}ms  p99 {p99:8.3f}ms  "
+        f"{rows:12.0f} rows/s  ({len(latencies)} requests)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    opts = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        path, X = train(root)
+        context = make_context(path)
+        for size in SIZES:
+            # fewer requests for large payloads
+            count = max(opts.requests // size, 10)
+            for layout in ("instances", "columns"):
+                events = list(payloads(X, context.columns, size, count, layout))
+                report(layout, size, *run(context, events))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,405 @@
+import json
+import mmap
 import os
-from pickle import dump
+import time
+from pickle import dump, dumps, load, loads
 
+import numpy as np
 import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import sklearn.metrics
 from digitalhub_runtime_python import handler
 from sklearn.datasets import load_breast_cancer
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.linear_model import SGDClassifier
 from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
 from sklearn.svm import SVC
 
+# the arrays of the model are also written out-of-band, aligned for mmap
+BUFFERS_SUFFIX = ".oob"
+BUFFER_ALIGNMENT = 64
+
+# kernel approximations for training on datasets too large for SVC
+APPROXIMATIONS = {"nystroem": Nystroem, "rff": RBFSampler}
+
+# rows read at once by the streaming training
+CHUNK_ROWS = 100_000
+
 
 @handler(outputs=["dataset"])
-def data_generator():
+def data_generator(compact=False):
     """
-    A function which generates the breast cancer dataset from scikit-learn
+    A function which generates the breast cancer dataset from scikit-learn.
+    With `compact`, features are stored as float32 and the label as int8
     """
     breast_cancer = load_breast_cancer()
     breast_cancer_dataset = pd.DataFrame(
         data=breast_cancer.data, columns=breast_cancer.feature_names
     )
     breast_cancer_labels = pd.DataFrame(data=breast_cancer.target, columns=["target"])
+    if compact:
+        breast_cancer_dataset = breast_cancer_dataset.astype(np.float32)
+        breast_cancer_labels = breast_cancer_labels.astype(np.int8)
     breast_cancer_dataset = pd.concat(
         [breast_cancer_dataset, breast_cancer_labels], axis=1
     )
     return breast_cancer_dataset
 
 
+def load_dataset(di):
+    """
+    Read the dataset from its parquet files into a feature matrix with the
+    stored dtype and a label vector. The Arrow columns are viewed without
+    conversion and copied once into the matrix, instead of going through a
+    pandas frame and the copy made by `drop`
+    """
+    path = di.download(destination="dataset/", overwrite=True)
+    table = pq.read_table(path, memory_map=True).combine_chunks()
+    names = [c for c in table.column_names if c != "target"]
+    columns = [table.column(c).to_numpy() for c in names]
+    X = np.empty(
+        (table.num_rows, len(names)), dtype=np.result_type(*columns), order="F"
+    )
+    for i, column in enumerate(columns):
+        X[:, i] = column
+    y = table.column("target").to_numpy()
+    return pd.DataFrame(X, columns=names, copy=False), pd.Series(y, name="target")
+
+
+def fit_approximate(
+    X, y, approximation, n_components, batch_size, epochs, random_state=5
+):
+    """
+    Fit a linear SVM on an approximation of the RBF kernel of the standardized
+    features, transforming and learning one mini-batch at a time so that the
+    expanded features are never materialized for the whole dataset
+    """
+    scaler = StandardScaler().fit(X)
+    # on standardized data, gamma="scale" of SVC is 1 / n_features
+    features = APPROXIMATIONS[approximation](
+        gamma=1.0 / X.shape[1], n_components=n_components, random_state=random_state
+    )
+    rng = np.random.default_rng(random_state)
+    sample = rng.choice(len(X), size=min(n_components, len(X)), replace=False)
+    features.fit(scaler.transform(X.iloc[sample]))
+
+    classifier = SGDClassifier(loss="hinge", random_state=random_state)
+    classes = np.unique(y)
+    for _ in range(epochs):
+        order = rng.permutation(len(X))
+        for start in range(0, len(X), batch_size):
+            batch = order[start : start + batch_size]
+            Z = features.transform(scaler.transform(X.iloc[batch]))
+            classifier.partial_fit(Z, y.iloc[batch], classes=classes)
+
+    return Pipeline(
+        [("scaler", scaler), ("features", features), ("classifier", classifier)]
+    )
+
+
 @handler(outputs=["model"])
-def train_model(project, di):
+def train_model(
+    project,
+    di,
+    approximation=None,
+    n_components=500,
+    batch_size=10_000,
+    epochs=5,
+):
     """
-    Train an SVM classifier on the breast cancer dataset and log metrics
+    Train an SVM classifier on the breast cancer dataset and log metrics.
+    With `approximation` ("nystroem" or "rff"), fit a linear SVM on an
+    approximate RBF kernel in mini-batches, which scales to many more rows
     """
-    df_cancer = di.as_df()
-    X = df_cancer.drop(["target"], axis=1)
-    y = df_cancer["target"]
+    X, y = load_dataset(di)
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.20, random_state=5
     )
-    svc_model = SVC()
-    svc_model.fit(X_train, y_train)
+    start = time.perf_counter()
+    if approximation is None:
+        svc_model = SVC()
+        svc_model.fit(X_train, y_train)
+    else:
+        svc_model = fit_approximate(
+            X_train, y_train, approximation, n_components, batch_size, epochs
+        )
+    fit_time = time.perf_counter() - start
     y_predict = svc_model.predict(X_test)
 
-    if not os.path.exists("model"):
-        os.makedirs("model")
-
-    with open("model/breast_cancer_classifier.pkl", "wb") as f:
-        dump(svc_model, f, protocol=5)
-
     metrics = {
         "f1_score": sklearn.metrics.f1_score(y_test, y_predict),
         "accuracy": sklearn.metrics.accuracy_score(y_test, y_predict),
         "precision": sklearn.metrics.precision_score(y_test, y_predict),
         "recall": sklearn.metrics.recall_score(y_test, y_predict),
+        "fit_time": fit_time,
     }
+    return log_classifier(project, svc_model, metrics)
+
+
+def read_chunks(path, chunk_rows):
+    """
+    Yield the features and labels of the dataset, `chunk_rows` rows at a time
+    """
+    # file by file: the dataset scanner reads ahead and its memory grows with
+    # the number of files
+    for file in ds.dataset(path, format="parquet").files:
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=chunk_rows):
+            df = batch.to_pandas()
+            yield df.drop(["target"], axis=1), df["target"]
+
+
+def in_holdout(X, holdout):
+    """
+    Assign rows to the holdout set by a hash of their values, so the split
+    does not depend on the order or the partitioning of the files
+    """
+    hashes = pd.util.hash_pandas_object(X, index=False).to_numpy()
+    return hashes % 10_000 < holdout * 10_000
+
+
+def confusion_metrics(cm):
+    """
+    Compute the metrics of the binary classifier from its confusion matrix,
+    as the sklearn metrics with `pos_label=1` and `zero_division=0`
+    """
+    tn, fp, fn, tp = cm.ravel()
+    return {
+        "f1_score": float(2 * tp / (2 * tp + fp + fn)) if tp + fp + fn else 0.0,
+        "accuracy": float((tp + tn) / cm.sum()) if cm.sum() else 0.0,
+        "precision": float(tp / (tp + fp)) if tp + fp else 0.0,
+        "recall": float(tp / (tp + fn)) if tp + fn else 0.0,
+    }
+
+
+@handler(outputs=["model"])
+def train_model_streaming(
+    project,
+    di,
+    approximation="rff",
+    n_components=500,
+    chunk_rows=CHUNK_ROWS,
+    batch_size=10_000,
+    epochs=5,
+    holdout=0.2,
+):
+    """
+    Train a linear SVM, on an approximate RBF kernel unless `approximation` is
+    None, reading the dataset in chunks and learning from mini-batches of them,
+    so that memory does not depend on its size. A hashed `holdout` fraction of
+    the rows is kept for the metrics
+    """
+    path = di.download(destination="dataset/", overwrite=True)
+    start = time.perf_counter()
+
+    # first pass: statistics of the features, and the classes of all the rows
+    # so that every holdout label has a row in the confusion matrix
+    scaler = StandardScaler()
+    classes = set()
+    sample = None
+    for X, y in read_chunks(path, chunk_rows):
+        train = ~in_holdout(X, holdout)
+        scaler.partial_fit(X[train])
+        classes.update(y.unique())
+        if sample is None:
+            sample = X[train].head(n_components)
+    classes = np.array(sorted(classes))
+
+    steps = [("scaler", scaler)]
+    if approximation is not None:
+        features = APPROXIMATIONS[approximation](
+            gamma=1.0 / scaler.n_features_in_,
+            n_components=n_components,
+            random_state=5,
+        )
+        features.fit(scaler.transform(sample))
+        steps.append(("features", features))
+    classifier = SGDClassifier(loss="hinge", random_state=5)
+    transform = Pipeline(steps)
+
+    rng = np.random.default_rng(5)
+    for _ in range(epochs):
+        for X, y in read_chunks(path, chunk_rows):
+            train = ~in_holdout(X, holdout)
+            order = rng.permutation(np.flatnonzero(train))
+            for i in range(0, len(order), batch_size):
+                batch = order[i : i + batch_size]
+                Z = transform.transform(X.iloc[batch])
+                classifier.partial_fit(Z, y.iloc[batch], classes=classes)
+    svc_model = Pipeline(steps + [("classifier", classifier)])
+    fit_time = time.perf_counter() - start
+
+    # last pass: confusion matrix of the holdout rows
+    cm = np.zeros((len(classes), len(classes)), dtype=np.int64)
+    for X, y in read_chunks(path, chunk_rows):
+        test = in_holdout(X, holdout)
+        if not test.any():
+            continue
+        y_predict = svc_model.predict(X[test])
+        np.add.at(
+            cm,
+            (np.searchsorted(classes, y[test]), np.searchsorted(classes, y_predict)),
+            1,
+        )
+
+    metrics = confusion_metrics(cm)
+    metrics["fit_time"] = fit_time
+    return log_classifier(project, svc_model, metrics)
+
+
+def log_classifier(project, svc_model, metrics):
+    """
+    Save the classifier, in-band and with out-of-band buffers, and log it
+    with its metrics
+    """
+    if not os.path.exists("model"):
+        os.makedirs("model")
+
+    with open("model/breast_cancer_classifier.pkl", "wb") as f:
+        dump(svc_model, f, protocol=5)
+    dump_buffers(svc_model, "model/breast_cancer_classifier" + BUFFERS_SUFFIX)
+
     model = project.log_model(
         name="breast_cancer_classifier", kind="sklearn", source="./model/"
     )
     model.log_metrics(metrics)
     return model
+
+
+def dump_buffers(obj, path):
+    """
+    Pickle an object with protocol 5, writing its contiguous arrays as
+    out-of-band buffers after the pickle stream instead of inside it. The file
+    starts with the length of a JSON index of the stream and buffer offsets
+    """
+    buffers = []
+    data = dumps(obj, protocol=5, buffer_callback=buffers.append)
+    raws = [b.raw() for b in buffers]
+
+    def layout(start):
+        offsets, pos = [], start
+        for n in [len(data)] + [r.nbytes for r in raws]:
+            pos = -(-pos // BUFFER_ALIGNMENT) * BUFFER_ALIGNMENT
+            offsets.append([pos, n])
+            pos += n
+        return offsets
+
+    # the index size depends on the offsets, which depend on the index size
+    offsets = layout(0)
+    while True:
+        index = json.dumps(offsets).encode()
+        updated = layout(8 + len(index))
+        if updated == offsets:
+            break
+        offsets = updated
+
+    with open(path, "wb") as f:
+        f.write(len(index).to_bytes(8, "little"))
+        f.write(index)
+        for (pos, _), chunk in zip(offsets, [data] + raws):
+            f.write(b"\0" * (pos - f.tell()))
+            f.write(chunk)
+
+
+def load_buffers(path):
+    """
+    Load an object written by dump_buffers, with its arrays memory-mapped from
+    the file instead of copied. Pages are copy-on-write, and shared by all the
+    processes which map the same file until they are written
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    size = int.from_bytes(mm[:8], "little")
+    offsets = json.loads(mm[8 : 8 + size])
+    view = memoryview(mm)
+    (pos, n), buffers = offsets[0], offsets[1:]
+    return loads(view[pos : pos + n], buffers=[view[p : p + k] for p, k in buffers])
+
+
+def load_model(path):
+    """
+    Load the classifier from a model folder or file, memory-mapping its arrays
+    when the out-of-band copy is available
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, "breast_cancer_classifier.pkl")
+    buffers = os.path.splitext(path)[0] + BUFFERS_SUFFIX
+    if os.path.exists(buffers):
+        return load_buffers(buffers)
+    with open(path, "rb") as f:
+        return load(f)
+
+
+def init_context(context, model_key):
+    """
+    Initialize serving context by loading the trained classifier
+    """
+    model = context.project.get_model(model_key)
+    classifier = load_model(model.download())
+
+    setattr(context, "model", classifier)
+    setattr(context, "columns", list(getattr(classifier, "feature_names_in_", [])))
+
+
+def predict(context, X):
+    """
+    Predict a matrix of rows, with the feature names the model was fitted on
+    """
+    if context.columns:
+        X = pd.DataFrame(X, columns=context.columns)
+    return context.model.predict(X)
+
+
+def parse_inputs(context, body):
+    """
+    Read the rows to predict from a columnar payload, a list of instances or
+    an inference protocol V2 tensor
+    """
+    if "columns" in body:
+        columns = body["columns"]
+        if context.columns:
+            missing = [c for c in context.columns if c not in columns]
+            if missing:
+                raise ValueError(f"Missing columns: {', '.join(missing)}")
+            columns = [columns[c] for c in context.columns]
+        else:
+            columns = list(columns.values())
+        return np.column_stack([np.asarray(c, dtype=np.float64) for c in columns])
+    if "instances" in body:
+        return np.atleast_2d(np.asarray(body["instances"], dtype=np.float64))
+    if "inputs" in body:
+        tensor = body["inputs"][0]
+        X = np.asarray(tensor["data"], dtype=np.float64)
+        return X.reshape(tensor.get("shape", X.shape))
+    raise ValueError("Expected one of columns, instances or inputs")
+
+
+def check_inputs(context, X):
+    """
+    Reject malformed rows before they reach the model
+    """
+    n = context.model.n_features_in_
+    if X.ndim != 2 or X.shape[1] != n:
+        raise ValueError(f"Expected rows of {n} features, got shape {X.shape}")
+    if len(X) == 0:
+        raise ValueError("No rows to predict")
+    return X
+
+
+def serve(context, event):
+    """
+    Predict all the rows of a request in a single call
+    """
+    if isinstance(event.body, bytes):
+        body = json.loads(event.body)
+    else:
+        body = event.body
+
+    try:
+        X = check_inputs(context, parse_inputs(context, body))
+    except (KeyError, TypeError, ValueError) as e:
+        return context.Response(body=str(e), content_type="text/plain", status_code=400)
+
+    return {"predictions": predict(context, X).tolist()}
@@ -1,5 +1,37 @@
+import hashlib
+import re
+
 from digitalhub_runtime_hera.dsl import step
 from hera.workflows import DAG, Workflow
+from hera.workflows import models as m
+
+# steps memoized by argo, in a ConfigMap of the workflow namespace. The
+# constants and memoize are the same in the pipeline.py of every scenario
+CACHE_CONFIG_MAP = "digitalhub-step-cache"
+CACHE_MAX_AGE = "720h"
+
+
+def memoize(*tasks, scope=None):
+    """
+    Let argo reuse the outputs of a previous run of each step when the function
+    version, the run arguments and the values of the inputs they refer to are
+    unchanged. A `scope` expression, such as the day the workflow was created,
+    is added to the keys of steps whose results also depend on something else,
+    like a remote file
+    """
+    for task in tasks:
+        args = task.template.args
+        key = hashlib.sha256("\0".join(args).encode()).hexdigest()[:16]
+        if scope:
+            key += "-" + scope
+        refs = re.findall(r"\{\{\s*([\w.-]+)\s*\}\}", " ".join(args))
+        if refs:
+            key += "-{{=sprig.sha256sum(" + ' + "," + '.join(refs) + ")}}"
+        task.template.memoize = m.Memoize(
+            key=key,
+            max_age=CACHE_MAX_AGE,
+            cache=m.Cache(config_map=m.LocalObjectReference(name=CACHE_CONFIG_MAP)),
+        )
 
 
 def pipeline():
@@ -16,5 +48,6 @@ def pipeline():
                 function="train-classifier",
                 inputs={"di": A.get_parameter("dataset")},
             )
+            memoize(A, B)
             A >> B
     return w
@@ -0,0 +1,58 @@
+"""
+Hyperparameter search benchmark: wall time, number of fits and best score of
+the serial grid search of `train_model`, the same grid search on a process
+pool, and successive halving on a process pool. The data is synthetic and
+the grid larger than the Iris one, so that the fits dominate.
+
+    python benchmarks/bench_search.py --rows 5000 --jobs -1
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from sklearn import svm
+from sklearn.datasets import make_classification
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from functions import make_search  # noqa: E402
+
+GRID = {
+    "kernel": ("linear", "rbf"),
+    "C": [0.1, 1, 10],
+    "gamma": ["scale", 0.01, 0.1],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--features", type=int, default=20)
+    parser.add_argument("--jobs", type=int, default=-1)
+    parser.add_argument("--factor", type=int, default=3)
+    opts = parser.parse_args()
+
+    X, y = make_classification(
+        opts.rows, opts.features, n_informative=10, flip_y=0.05, random_state=0
+    )
+    runs = (
+        ("grid", "grid", None),
+        ("grid pool", "grid", opts.jobs),
+        ("halving pool", "halving", opts.jobs),
+    )
+    for name, search, n_jobs in runs:
+        clf = make_search(svm.SVC(), GRID, search, n_jobs, opts.factor)
+        t0 = time.perf_counter()
+        clf.fit(X, y)
+        elapsed = time.perf_counter() - t0
+        fits = len(clf.cv_results_["params"]) * clf.n_splits_
+        print(
+            f"{name:>12}: {elapsed:8.2f}s  {fits:4d} fits  "
+            f"best {clf.best_score_:.4f} {clf.best_params_}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,34 @@ import mlflow
 from digitalhub import from_mlflow_run, get_mlflow_model_metrics
 from digitalhub_runtime_python import handler
 from sklearn import datasets, svm
-from sklearn.model_selection import GridSearchCV
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import GridSearchCV, HalvingGridSearchCV
+
+# hyperparameter search space
+PARAMETERS = {"kernel": ("linear", "rbf"), "C": [1, 10]}
+
+
+def make_search(estimator, parameters, search="grid", n_jobs=None, factor=3):
+    """
+    Build the hyperparameter search: an exhaustive grid search, or successive
+    halving, which evaluates all the candidates on a subset of the samples
+    and keeps the best 1 / `factor` of them for the next, `factor` times
+    larger, subset. Candidates and folds are fitted by `n_jobs` processes,
+    all the cores by default when halving
+    """
+    if search == "grid":
+        return GridSearchCV(estimator, parameters, n_jobs=n_jobs)
+    if search == "halving":
+        if n_jobs is None:
+            n_jobs = -1
+        return HalvingGridSearchCV(
+            estimator, parameters, factor=factor, n_jobs=n_jobs, random_state=0
+        )
+    raise ValueError(f"Unknown search {search}")
 
 
 @handler(outputs=["model"])
-def train_model(project):
+def train_model(project, search="grid", n_jobs=None, factor=3):
     """
     Train an SVM classifier on the Iris dataset with hyperparameter tuning using MLflow
     """
@@ -16,13 +39,21 @@ def train_model(project):
     # Load Iris dataset
     iris = datasets.load_iris()
 
-    # Define hyperparameter search space
-    parameters = {"kernel": ("linear", "rbf"), "C": [1, 10]}
+    # Define hyperparameter search
     svc = svm.SVC()
-    clf = GridSearchCV(svc, parameters)
+    clf = make_search(svc, PARAMETERS, search, n_jobs, factor)
+
+    # Train model with the search, in a single MLflow run
+    with mlflow.start_run():
+        clf.fit(iris.data, iris.target)
 
-    # Train model with grid search
-    clf.fit(iris.data, iris.target)
+        # autologging records the candidates of grid searches only
+        if search == "halving":
+            mlflow.log_params({f"best_{k}": v for k, v in clf.best_params_.items()})
+            mlflow.log_metric("best_cv_score", clf.best_score_)
+            for i, n in enumerate(clf.n_resources_):
+                mlflow.log_metric("n_resources", n, step=i)
+                mlflow.log_metric("n_candidates", clf.n_candidates_[i], step=i)
 
     # Get MLflow run information
     run_id = mlflow.last_active_run().info.run_id
@@ -0,0 +1,128 @@
+"""
+Cold start of the serving function: time spent by `init_context` in a fresh
+process, with the previous download, extract and load from disk, and with
+the digest-keyed model cache, empty (first replica) and populated (restart
+or second replica of the node). The download copies the zip from a local
+"store" at `--mbps` megabytes per second.
+
+    python benchmarks/bench_coldstart.py --epochs 1 --runs 5 --mbps 50
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from zipfile import ZipFile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+MODES = ["extract", "cache-empty", "cache-populated"]
+
+
+def train(root, epochs):
+    from bench_serve import train as train_model
+
+    path, _ = train_model(root, epochs)
+    return path
+
+
+def make_model(source, mbps):
+    def download(destination=None, overwrite=False):
+        # transfer time of the artifact store, then a local copy
+        time.sleep(os.path.getsize(source) / (mbps * 1e6))
+        os.makedirs(destination or "model", exist_ok=True)
+        return shutil.copy(source, destination or "model")
+
+    return SimpleNamespace(
+        key="store://project/model/model/air-passengers-forecaster:1",
+        status=SimpleNamespace(files=[{"path": source, "hash": "sha256:0123"}]),
+        download=download,
+    )
+
+
+def init_context_extract(context, model_key):
+    # init_context before the model cache
+    from darts.models import NBEATSModel
+
+    model = context.project.get_model(model_key)
+    path = model.download()
+    local_path_model = "extracted_model/"
+    with ZipFile(path, "r") as zip_ref:
+        zip_ref.extractall(local_path_model)
+    name_model_local = local_path_model + "predictor_model.pt"
+    mm = NBEATSModel(24, 12).load(name_model_local)
+    setattr(context, "model", mm)
+
+
+def child(mode, source, cache_dir, mbps):
+    t0 = time.perf_counter()
+    import functions
+    import serving
+
+    imported = time.perf_counter()
+    serving.MODEL_CACHE_DIR = cache_dir
+    if mode == "cache-empty":
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    model = make_model(source, mbps)
+    context = SimpleNamespace(
+        project=SimpleNamespace(get_model=lambda key: model),
+        logger=logging.getLogger("serve"),
+    )
+    with tempfile.TemporaryDirectory() as cwd:
+        os.chdir(cwd)
+        start = time.perf_counter()
+        if mode == "extract":
+            init_context_extract(context, "air-passengers-forecaster")
+        else:
+            functions.init_context(context, "air-passengers-forecaster")
+        end = time.perf_counter()
+    print(json.dumps({"import": imported - t0, "init": end - start}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mbps", type=float, default=50)
+    parser.add_argument("--child", choices=MODES)
+    parser.add_argument("--source")
+    parser.add_argument("--cache-dir")
+    opts = parser.parse_args()
+
+    if opts.child:
+        child(opts.child, opts.source, opts.cache_dir, opts.mbps)
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        source = train(root, opts.epochs)
+        cache_dir = os.path.join(root, "cache")
+        size = os.path.getsize(source) / 1e6
+        print(f"model zip: {size:.1f}MB, download at {opts.mbps:.0f}MB/s")
+
+        for mode in MODES:
+            times = []
+            for _ in range(opts.runs):
+                cmd = [sys.executable, __file__, "--child", mode, "--source", source]
+                cmd += ["--cache-dir", cache_dir, "--mbps", str(opts.mbps)]
+                out = subprocess.run(
+                    cmd, check=True, capture_output=True, text=True
+                ).stdout
+                times.append(json.loads(out.strip().splitlines()[-1]))
+            imports = statistics.median(t["import"] for t in times)
+            init = statistics.median(t["init"] for t in times)
+            print(
+                f"{mode:>16}: imports {imports * 1000:8.1f}ms  "
+                f"init_context {init * 1000:8.1f}ms  total {(imports + init) * 1000:8.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
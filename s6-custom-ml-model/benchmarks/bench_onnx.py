@@ -0,0 +1,169 @@
+"""
+Serving with darts against serving the exported network with onnxruntime:
+import time of the serving module, init_context time, peak memory of the
+process, and latency of single-series and batched requests, each in a fresh
+process with the forecast cache disabled. Also reports the largest relative
+difference between the forecasts of the two.
+
+    python benchmarks/bench_onnx.py --epochs 5 --requests 64 --batch 256
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+MODULES = {"darts": "functions", "onnx": "serve_onnx"}
+
+
+def train(root, epochs):
+    from bench_serve import train as train_model
+    from functions import export_onnx
+
+    path, series = train_model(root, epochs)
+    from darts.models import NBEATSModel
+
+    model = NBEATSModel.load(os.path.join(root, "predictor_model.pt"))
+    onnx_path = os.path.join(root, "predictor_model.onnx")
+    export_onnx(model, onnx_path)
+    return {"darts": path, "onnx": onnx_path}, series
+
+
+def histories(dates, values, count, length=48, seed=1):
+    # as bench_serve.histories, without importing darts in the child
+    rng = np.random.default_rng(seed)
+    dates, values = dates[-length:], np.array(values[-length:])
+    for i in range(count):
+        noisy = values * rng.uniform(0.5, 2) * rng.normal(1, 0.02, size=length)
+        yield {
+            "id": f"series-{i}",
+            "inference_input": [
+                {"date": d, "value": v} for d, v in zip(dates, noisy.tolist())
+            ],
+        }
+
+
+def peak_rss():
+    # in MB; unlike ru_maxrss, not inherited from the parent across exec
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+
+
+def child(runtime, source, cache_dir, requests, batch):
+    t0 = time.perf_counter()
+    functions = importlib.import_module(MODULES[runtime])
+    imported = time.perf_counter()
+
+    import serving
+
+    serving.MODEL_CACHE_DIR = cache_dir
+    model = SimpleNamespace(
+        key=f"store://project/model/model/{runtime}:1",
+        status=SimpleNamespace(files=[]),
+        download=lambda destination, overwrite: shutil.copy(source, destination),
+    )
+    context = SimpleNamespace(
+        project=SimpleNamespace(get_model=lambda key: model),
+        logger=logging.getLogger("serve"),
+    )
+    start = time.perf_counter()
+    functions.init_context(context, "air-passengers-forecaster", cache_size=0)
+    init = time.perf_counter() - start
+
+    with open(os.path.join(cache_dir, "series.json")) as f:
+        series = json.load(f)
+    inputs = list(histories(series["dates"], series["values"], max(requests, batch)))
+
+    single = []
+    for s in inputs[:requests]:
+        event = SimpleNamespace(body={"inference_input": s["inference_input"]})
+        t = time.perf_counter()
+        forecast = functions.serve_predictions(context, event)
+        single.append(time.perf_counter() - t)
+
+    event = SimpleNamespace(body={"series": inputs[:batch]})
+    functions.serve_predictions(context, event)  # warm up
+    t = time.perf_counter()
+    res = functions.serve_predictions(context, event)
+    batched = time.perf_counter() - t
+
+    print(
+        json.dumps(
+            {
+                "import": imported - t0,
+                "init": init,
+                "single": float(np.median(single[1:])),
+                "batched": batched,
+                "maxrss": peak_rss(),
+                "forecasts": [res["predictions"][s["id"]] for s in inputs[:8]]
+                + [forecast],
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--child", choices=MODULES)
+    parser.add_argument("--source")
+    parser.add_argument("--cache-dir")
+    opts = parser.parse_args()
+
+    if opts.child:
+        child(opts.child, opts.source, opts.cache_dir, opts.requests, opts.batch)
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        sources, series = train(root, opts.epochs)
+        cache_dir = os.path.join(root, "cache")
+        os.makedirs(cache_dir)
+        with open(os.path.join(cache_dir, "series.json"), "w") as f:
+            dates = series.time_index.as_unit("ms").asi8.tolist()
+            json.dump(
+                {"dates": dates, "values": series.univariate_values().tolist()}, f
+            )
+
+        results = {}
+        for runtime, source in sources.items():
+            cmd = [sys.executable, __file__, "--child", runtime, "--source", source]
+            cmd += ["--cache-dir", cache_dir, "--requests", str(opts.requests)]
+            cmd += ["--batch", str(opts.batch)]
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True)
+            res = results[runtime] = json.loads(out.stdout.strip().splitlines()[-1])
+            print(
+                f"{runtime:>6}: import {res['import'] * 1000:8.1f}ms  "
+                f"init_context {res['init'] * 1000:8.1f}ms  "
+                f"max RSS {res['maxrss']:7.1f}MB  "
+                f"single {res['single'] * 1000:7.2f}ms/request  "
+                f"batch of {opts.batch} {res['batched'] * 1000:8.2f}ms"
+            )
+
+        for a, b in zip(results["darts"]["forecasts"], results["onnx"]["forecasts"]):
+            assert [r["date"] for r in a] == [r["date"] for r in b]
+        expected = np.array(
+            [[r["value"] for r in f] for f in results["darts"]["forecasts"]]
+        )
+        actual = np.array(
+            [[r["value"] for r in f] for f in results["onnx"]["forecasts"]]
+        )
+        print(f"max relative difference {np.max(np.abs(actual / expected - 1)):.2e}")
+
+
+if __name__ == "__main__":
+    main()
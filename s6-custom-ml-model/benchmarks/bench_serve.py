@@ -0,0 +1,127 @@
+"""
+Throughput of the forecasting API: series forecast per second when each
+series is sent in its own request, against batched requests of 1 to 1024
+series. Each request is also repeated, to measure forecasts served by the
+cache. The model is a NBEATS trained for a few epochs, and the series are Air
+Passengers histories with random scale and noise.
+
+    python benchmarks/bench_serve.py --epochs 5 --single 64
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from zipfile import ZipFile
+
+import numpy as np
+from darts.datasets import AirPassengersDataset
+from darts.models import NBEATSModel
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import serving  # noqa: E402
+from functions import init_context, serve_predictions  # noqa: E402
+
+SIZES = [1, 8, 64, 256, 1024]
+
+
+def train(root, epochs):
+    # Same model as train_model, with fewer epochs
+    series = AirPassengersDataset().load()
+    model = NBEATSModel(
+        input_chunk_length=24, output_chunk_length=12, n_epochs=epochs, random_state=0
+    )
+    model.fit(series[:-36], verbose=False)
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        model.save("predictor_model.pt")
+        with ZipFile("predictor_model.pt.zip", "w") as z:
+            z.write("predictor_model.pt")
+            z.write("predictor_model.pt.ckpt")
+    finally:
+        os.chdir(cwd)
+    return os.path.join(root, "predictor_model.pt.zip"), series
+
+
+def make_context(path):
+    model = SimpleNamespace(
+        key="store://project/model/model/air-passengers-forecaster:1",
+        status=SimpleNamespace(files=[]),
+        download=lambda destination, overwrite: shutil.copy(path, destination),
+    )
+    context = SimpleNamespace(
+        project=SimpleNamespace(get_model=lambda key: model),
+        logger=logging.getLogger("serve"),
+    )
+    init_context(context, "air-passengers-forecaster")
+    return context
+
+
+def histories(series, count, length=48, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = series.time_index[-length:].as_unit("ms").asi8.tolist()
+    values = series.univariate_values()[-length:]
+    for i in range(count):
+        noisy = values * rng.uniform(0.5, 2) * rng.normal(1, 0.02, size=length)
+        yield {
+            "id": f"series-{i}",
+            "inference_input": [
+                {"date": d, "value": v} for d, v in zip(dates, noisy.tolist())
+            ],
+        }
+
+
+def report(name, size, count, elapsed):
+    print(
+        f"{name:>8} {size:5d} series/request: {count / elapsed:10.1f} series/s  "
+        f"{elapsed / max(count // size, 1) * 1000:10.2f}ms/request"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--single", type=int, default=64)
+    opts = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        path, series = train(root, opts.epochs)
+        serving.MODEL_CACHE_DIR = os.path.join(root, "cache")
+        context = make_context(path)
+
+        inputs = list(histories(series, max(SIZES)))
+
+        # one request per series, as clients do today
+        events = [
+            SimpleNamespace(body={"inference_input": s["inference_input"]})
+            for s in inputs[: opts.single]
+        ]
+        for name in ("single", "cached"):
+            t0 = time.perf_counter()
+            for event in events:
+                serve_predictions(context, event)
+            report(name, 1, opts.single, time.perf_counter() - t0)
+
+        for size in SIZES:
+            event = SimpleNamespace(body={"series": inputs[:size]})
+            serve_predictions(context, event)  # warm up
+            context.forecasts = serving.ForecastCache()
+            t0 = time.perf_counter()
+            res = serve_predictions(context, event)
+            report("batched", size, size, time.perf_counter() - t0)
+            assert len(res["predictions"]) == size
+
+            t0 = time.perf_counter()
+            cached = serve_predictions(context, event)
+            report("cached", size, size, time.perf_counter() - t0)
+            assert cached == res
+
+
+if __name__ == "__main__":
+    main()
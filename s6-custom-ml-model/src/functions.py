@@ -1,13 +1,34 @@
+import copy
 import json
+import os
+import shutil
+import sys
+import tempfile
 from zipfile import ZipFile
 
 import pandas as pd
+import torch
 from darts import TimeSeries
 from darts.datasets import AirPassengersDataset
 from darts.metrics import mae, mape, smape
 from darts.models import NBEATSModel
 from digitalhub_runtime_python import handler
 
+# the function runs from a checkout of the repository, next to its modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from serving import (  # noqa: E402
+    FORECAST_CACHE_SIZE,
+    FORECAST_CACHE_TTL,
+    ForecastCache,
+    cached_download,
+    forecast_key,
+    to_arrays,
+)
+
+# series forecast by each forward pass of a batched request
+PREDICT_BATCH_SIZE = 1024
+
 
 @handler(outputs=["model"])
 def train_model(project):
@@ -49,52 +70,177 @@ def train_model(project):
         framework="darts",
     )
     model_artifact.log_metrics(metrics)
+
+    # Export the network for the ONNX serving function
+    export_onnx(model, "predictor_model.onnx")
+    onnx_artifact = project.log_model(
+        name="air-passengers-forecaster-onnx",
+        kind="model",
+        source="predictor_model.onnx",
+        algorithm="darts.models.NBEATSModel",
+        framework="onnx",
+    )
+    onnx_artifact.log_metrics(metrics)
     return model_artifact
 
 
-def init_context(context, model_key):
+class ForecastNetwork(torch.nn.Module):
+    """
+    Stacks of a trained NBEATS network, mapping the last input_chunk_length
+    values of a batch of univariate series to their next output_chunk_length
+    values
+    """
+
+    def __init__(self, stacks):
+        super().__init__()
+        self.stacks = stacks
+
+    def forward(self, x):
+        # Same computation as the forward of the darts module, on a tensor
+        x = x.squeeze(dim=2)
+        y = 0
+        for stack in self.stacks:
+            x, forecast = stack(x)
+            y = y + forecast
+        return y[:, :, 0]
+
+
+def export_onnx(model, path):
+    """
+    Export the network of a trained NBEATS model to ONNX, in float32, with
+    inputs of shape (batch, input_chunk_length, 1)
+    """
+    stacks = copy.deepcopy(model.model.stacks).float().eval()
+    x = torch.zeros(1, model.input_chunk_length, 1)
+    torch.onnx.export(
+        ForecastNetwork(stacks),
+        (x,),
+        path,
+        input_names=["x"],
+        output_names=["y"],
+        dynamic_axes={"x": {0: "batch"}, "y": {0: "batch"}},
+        dynamo=False,
+    )
+
+
+def extract_model(path):
+    """
+    Extract the zip of a model once, into a folder next to it. The files are
+    extracted into a temporary folder and moved into place, so that a
+    concurrent replica never reads a partial model
+    """
+    folder = os.path.splitext(path)[0]
+    if os.path.isdir(folder):
+        return folder
+
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(path))
+    try:
+        with ZipFile(path, "r") as z:
+            z.extractall(tmp)
+        os.replace(tmp, folder)
+    except OSError:
+        # extracted by another replica in the meantime
+        if not os.path.isdir(folder):
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return folder
+
+
+def load_model(path):
+    """
+    Load the NBEATS model and its checkpoint from the cached zip file
+    """
+    folder = extract_model(path)
+    return NBEATSModel.load(
+        os.path.join(folder, "predictor_model.pt"), map_location="cpu"
+    )
+
+
+def init_context(
+    context, model_key, cache_size=FORECAST_CACHE_SIZE, cache_ttl=FORECAST_CACHE_TTL
+):
     """
     Initialize serving context by loading the trained model
     """
     model = context.project.get_model(model_key)
-    path = model.download()
-    local_path_model = "extracted_model/"
+    path = cached_download(model, ".zip")
+    context.logger.info(f"Loading model {model_key} from {path}")
 
-    # Extract model from zip file
-    with ZipFile(path, "r") as zip_ref:
-        zip_ref.extractall(local_path_model)
+    setattr(context, "model", load_model(path))
+    setattr(context, "forecasts", ForecastCache(cache_size, cache_ttl))
+
+
+def to_series(dates, values, bounds):
+    """
+    Build the TimeSeries of the inputs found at `bounds` in the arrays
+    """
+    times = pd.to_datetime(dates, unit="ms")
+    return [
+        TimeSeries.from_times_and_values(times[i:j], values[i:j]) for i, j in bounds
+    ]
 
-    # Load the NBEATS model
-    input_chunk_length = 24
-    output_chunk_length = 12
-    name_model_local = local_path_model + "predictor_model.pt"
-    mm = NBEATSModel(input_chunk_length, output_chunk_length).load(name_model_local)
 
-    setattr(context, "model", mm)
+def to_records(ts):
+    """
+    Convert a forecast to a list of {date, value} records, dates in ms
+    """
+    dates = ts.time_index.as_unit("ms").asi8.tolist()
+    values = ts.univariate_values().tolist()
+    return [{"date": d, "value": v} for d, v in zip(dates, values)]
 
 
 def serve_predictions(context, event):
     """
-    Serve time series predictions via REST API
+    Serve time series predictions via REST API. The body holds either one
+    `inference_input`, or a list of `series` with an `id` and an
+    `inference_input` each, forecast together. Forecasts of series already
+    seen are served from the cache
     """
     if isinstance(event.body, bytes):
         body = json.loads(event.body)
     else:
         body = event.body
 
-    context.logger.info(f"Received event: {body}")
-    inference_input = body["inference_input"]
-
-    # Convert input to Darts TimeSeries format
-    pdf = pd.DataFrame(inference_input)
-    pdf["date"] = pd.to_datetime(pdf["date"], unit="ms")
-
-    ts = TimeSeries.from_dataframe(pdf, time_col="date", value_cols="value")
+    if "series" in body:
+        ids = [s["id"] for s in body["series"]]
+        inputs = [s["inference_input"] for s in body["series"]]
+        context.logger.info(f"Received event: {len(inputs)} series")
+    else:
+        context.logger.info(f"Received event: {body}")
+        ids = None
+        inputs = [body["inference_input"]]
 
-    # Make predictions
     output_chunk_length = 12
-    result = context.model.predict(n=output_chunk_length * 2, series=ts)
+    n = output_chunk_length * 2
+
+    # Look up the forecasts of the inputs in the cache
+    dates, values, bounds = to_arrays(inputs)
+    keys = [forecast_key(dates[i:j], values[i:j], n) for i, j in bounds]
+    forecasts = [context.forecasts.get(key) for key in keys]
+    missing = [k for k, f in enumerate(forecasts) if f is None]
+    context.logger.info(
+        f"Forecast cache: {len(inputs) - len(missing)} hits, {len(missing)} misses "
+        f"({context.forecasts.hits} hits, {context.forecasts.misses} misses in total)"
+    )
 
-    # Convert result to JSON format
-    jsonstr = result.pd_dataframe().reset_index().to_json(orient="records")
-    return json.loads(jsonstr)
+    if missing:
+        # Convert inputs to Darts TimeSeries format
+        series = to_series(dates, values, [bounds[k] for k in missing])
+
+        # Make predictions, in one batch
+        results = context.model.predict(
+            n=n,
+            series=series,
+            batch_size=min(len(series), PREDICT_BATCH_SIZE),
+            verbose=False,
+        )
+
+        # Convert results to JSON format
+        for k, ts in zip(missing, results):
+            forecasts[k] = to_records(ts)
+            context.forecasts.put(keys[k], forecasts[k])
+
+    if ids is None:
+        return forecasts[0]
+    return {"predictions": dict(zip(ids, forecasts))}
@@ -0,0 +1,133 @@
+import json
+import os
+import sys
+
+import numpy as np
+import onnxruntime as ort
+import pandas as pd
+
+# Serving of the NBEATS network exported by train_model, with onnxruntime
+# instead of darts and torch.
+
+# the function runs from a checkout of the repository, next to its modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from serving import (  # noqa: E402
+    FORECAST_CACHE_SIZE,
+    FORECAST_CACHE_TTL,
+    ForecastCache,
+    cached_download,
+    forecast_key,
+    to_arrays,
+)
+
+# fixed by the exported network
+INPUT_CHUNK_LENGTH = 24
+OUTPUT_CHUNK_LENGTH = 12
+
+# series forecast by each run of the network
+PREDICT_BATCH_SIZE = 1024
+
+
+def init_context(
+    context, model_key, cache_size=FORECAST_CACHE_SIZE, cache_ttl=FORECAST_CACHE_TTL
+):
+    """
+    Initialize serving context by loading the exported network
+    """
+    model = context.project.get_model(model_key)
+    path = cached_download(model, ".onnx")
+    context.logger.info(f"Loading model {model_key} from {path}")
+
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    setattr(context, "session", session)
+    setattr(context, "forecasts", ForecastCache(cache_size, cache_ttl))
+
+
+def forecast(session, windows, n):
+    """
+    Forecast `n` steps after each window of INPUT_CHUNK_LENGTH values, feeding
+    the forecasts back as inputs beyond OUTPUT_CHUNK_LENGTH steps as darts does
+    """
+    steps = []
+    x = windows.astype(np.float32)
+    for _ in range(-(-n // OUTPUT_CHUNK_LENGTH)):
+        y = np.concatenate(
+            [
+                session.run(None, {"x": x[i : i + PREDICT_BATCH_SIZE, :, None]})[0]
+                for i in range(0, len(x), PREDICT_BATCH_SIZE)
+            ]
+        )
+        steps.append(y)
+        x = np.concatenate([x[:, OUTPUT_CHUNK_LENGTH:], y], axis=1)
+    return np.concatenate(steps, axis=1)[:, :n].astype(np.float64)
+
+
+def future_dates(dates, n):
+    """
+    Dates in ms of the `n` steps after a series, at its frequency
+    """
+    index = pd.DatetimeIndex(pd.to_datetime(dates, unit="ms"))
+    if index.inferred_freq is None:
+        raise ValueError("Could not infer the frequency of the input series")
+    future = pd.date_range(index[-1], periods=n + 1, freq=index.inferred_freq)[1:]
+    return future.as_unit("ms").asi8.tolist()
+
+
+def serve_predictions(context, event):
+    """
+    Serve time series predictions via REST API, as the serving function of
+    functions.py. The body holds either one `inference_input`, or a list of
+    `series` with an `id` and an `inference_input` each, forecast together.
+    Forecasts of series already seen are served from the cache
+    """
+    if isinstance(event.body, bytes):
+        body = json.loads(event.body)
+    else:
+        body = event.body
+
+    if "series" in body:
+        ids = [s["id"] for s in body["series"]]
+        inputs = [s["inference_input"] for s in body["series"]]
+        context.logger.info(f"Received event: {len(inputs)} series")
+    else:
+        context.logger.info(f"Received event: {body}")
+        ids = None
+        inputs = [body["inference_input"]]
+
+    n = OUTPUT_CHUNK_LENGTH * 2
+
+    # Look up the forecasts of the inputs in the cache
+    dates, values, bounds = to_arrays(inputs)
+    keys = [forecast_key(dates[i:j], values[i:j], n) for i, j in bounds]
+    forecasts = [context.forecasts.get(key) for key in keys]
+    missing = [k for k, f in enumerate(forecasts) if f is None]
+    context.logger.info(
+        f"Forecast cache: {len(inputs) - len(missing)} hits, {len(missing)} misses "
+        f"({context.forecasts.hits} hits, {context.forecasts.misses} misses in total)"
+    )
+
+    if missing:
+        if any(bounds[k][1] - bounds[k][0] < INPUT_CHUNK_LENGTH for k in missing):
+            raise ValueError(
+                f"Input series must have at least {INPUT_CHUNK_LENGTH} values"
+            )
+
+        # Make predictions from the last values of each series, in one batch
+        windows = np.stack(
+            [values[bounds[k][1] - INPUT_CHUNK_LENGTH : bounds[k][1]] for k in missing]
+        )
+        results = forecast(context.session, windows, n)
+
+        # Convert results to JSON format
+        for k, result in zip(missing, results):
+            i, j = bounds[k]
+            forecasts[k] = [
+                {"date": d, "value": v}
+                for d, v in zip(future_dates(dates[i:j], n), result.tolist())
+            ]
+            context.forecasts.put(keys[k], forecasts[k])
+
+    if ids is None:
+        return forecasts[0]
+    return {"predictions": dict(zip(ids, forecasts))}
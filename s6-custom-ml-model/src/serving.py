@@ -0,0 +1,107 @@
+import hashlib
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Model and forecast caches of the serving functions, shared by functions.py
+# and serve_onnx.py. Kept free of darts and torch.
+
+# local cache of the downloaded models, shared by the replicas of a node when
+# mounted from the host
+MODEL_CACHE_DIR = os.environ.get("MODEL_CACHE_DIR", "/tmp/model-cache")
+
+# forecasts kept by the serving cache, and for how many seconds
+FORECAST_CACHE_SIZE = 10_000
+FORECAST_CACHE_TTL = 3600
+
+
+def model_digest(model):
+    """
+    Digest identifying the content of a model: the hashes of its files when
+    the platform recorded them, its versioned key otherwise
+    """
+    hashes = sorted(f.get("hash") or "" for f in model.status.files or [])
+    source = "\n".join(hashes) if hashes and all(hashes) else model.key
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def cached_download(model, suffix):
+    """
+    Download a model once into a cache keyed by its digest, as a file ending
+    with `suffix`. The file is downloaded next to the cache and moved into
+    place, so that a concurrent replica never reads a partial file
+    """
+    path = os.path.join(MODEL_CACHE_DIR, model_digest(model) + suffix)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=MODEL_CACHE_DIR)
+    try:
+        os.replace(model.download(destination=tmp, overwrite=True), path)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return path
+
+
+class ForecastCache:
+    """
+    LRU cache of forecasts, whose entries expire `ttl` seconds after being
+    stored. Counts the hits and misses of the lookups
+    """
+
+    def __init__(self, maxsize=FORECAST_CACHE_SIZE, ttl=FORECAST_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+def to_arrays(inputs):
+    """
+    Normalize many inputs to two arrays holding the dates in ms and the values
+    of all of their records, and the bounds of each input in the arrays
+    """
+    records = list(itertools.chain.from_iterable(inputs))
+    offsets = np.cumsum([0] + [len(r) for r in inputs])
+    dates = np.fromiter((r["date"] for r in records), np.int64, len(records))
+    values = np.fromiter((r["value"] for r in records), np.float64, len(records))
+    return dates, values, list(zip(offsets[:-1], offsets[1:]))
+
+
+def forecast_key(dates, values, n):
+    """
+    Cache key of the forecast of `n` steps of a normalized series
+    """
+    key = hashlib.blake2b(n.to_bytes(4, "little"), digest_size=16)
+    key.update(dates.tobytes())
+    key.update(values.tobytes())
+    return key.digest()
@@ -30,10 +30,28 @@ from transformers.trainer_utils import get_last_checkpoint, is_main_process
 from transformers.utils import check_min_version, send_example_telemetry
 from transformers.utils.versions import require_version
 
+# the function runs from a checkout of the repository: the background metrics
+# logger is the one of the torch translation tutorial
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "..",
+        "..",
+        "torch-translation-tutorial",
+        "src",
+    )
+)
+
+from metrics import MetricsLogger  # noqa: E402
+
 
 class LoggingCallback(TrainerCallback):
     def __init__(self, run):
         self.run = run
+        self.metrics_logger = MetricsLogger(run)
+
+    def close(self):
+        self.metrics_logger.close()
 
     def on_log(self, args, state, control, logs, model=None, **kwargs):
         metrics = {}
@@ -47,8 +65,7 @@ class LoggingCallback(TrainerCallback):
                     f'Trainer is attempting to log a value of "{v}" of type {type(v)} for key "{k}" as a metric. '
                     "MLflow's log_metric() only accepts float and int types so we dropped this attribute."
                 )
-            if k in metrics:
-                self.run.log_metric(k, metrics[k])
+        self.metrics_logger.log_metrics(metrics)
 
 
 logger = logging.getLogger(__name__)
@@ -736,9 +753,10 @@ def train_and_log_model(
     if max_eval_samples is not None:
         args.append(f"--max_eval_samples={max_eval_samples}")
 
-    result = main(
-        callback=LoggingCallback(project.get_run(os.environ["RUN_ID"])), args=args
-    )
+    callback = LoggingCallback(project.get_run(os.environ["RUN_ID"]))
+    result = main(callback=callback, args=args)
+    # metrics are read back from the run below
+    callback.close()
 
     model_params = {
         "max_sequence_length": max_sequence_length,
@@ -0,0 +1,125 @@
+"""
+Cost of metric logging in a training loop, against a local stub of the run
+API that answers after a given latency. The stub run sends one read and one
+update request per metric, as the platform SDK does. The loop logs
+`--metrics` values every step, either synchronously to the run or through
+the background MetricsLogger.
+
+    python benchmarks/bench_metrics.py --steps 200 --step-ms 10 --latency-ms 50
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.metrics import MetricsLogger  # noqa: E402
+
+
+def serve(latency):
+    metrics = {}
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, body):
+            time.sleep(latency)
+            requests.append(self.command)
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._reply(metrics)
+
+        def do_PUT(self):
+            key = self.path.rsplit("/", 1)[-1]
+            length = int(self.headers["Content-Length"])
+            metrics[key] = json.loads(self.rfile.read(length))
+            self._reply({})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, metrics, requests
+
+
+class StubRun:
+    def __init__(self, url):
+        self.url = url
+
+    def _call(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(f"{self.url}{path}", data=data, method=method)
+        with urllib.request.urlopen(req) as res:
+            return json.loads(res.read())
+
+    def log_metrics(self, metrics):
+        for key, value in metrics.items():
+            stored = self._call("GET", "/metrics")
+            values = stored.get(key, [])
+            values = values + (value if isinstance(value, list) else [value])
+            self._call("PUT", f"/metrics/{key}", values)
+
+
+def train(log, steps, step_ms, n_metrics):
+    blocked = []
+    for step in range(steps):
+        time.sleep(step_ms / 1000)
+        metrics = {f"metric_{i}": step * 0.1 + i for i in range(n_metrics)}
+        t0 = time.perf_counter()
+        log(metrics)
+        blocked.append(time.perf_counter() - t0)
+    return np.array(blocked) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--step-ms", type=float, default=10)
+    parser.add_argument("--metrics", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    opts = parser.parse_args()
+
+    for mode in ("sync", "background"):
+        server, metrics, requests = serve(opts.latency_ms / 1000)
+        run = StubRun(f"http://127.0.0.1:{server.server_address[1]}")
+
+        t0 = time.perf_counter()
+        if mode == "sync":
+            blocked = train(run.log_metrics, opts.steps, opts.step_ms, opts.metrics)
+            loop = time.perf_counter() - t0
+        else:
+            metrics_logger = MetricsLogger(run, flush_interval=opts.flush_interval)
+            blocked = train(
+                metrics_logger.log_metrics, opts.steps, opts.step_ms, opts.metrics
+            )
+            loop = time.perf_counter() - t0
+            metrics_logger.close()
+        total = time.perf_counter() - t0
+        server.shutdown()
+
+        logged = sum(len(v) for v in metrics.values())
+        p50, p99 = np.percentile(blocked, [50, 99])
+        print(
+            f"{mode:>10}: loop {loop:7.2f}s  with final flush {total:7.2f}s  "
+            f"log call p50 {p50:8.3f}ms p99 {p99:8.3f}ms  "
+            f"{len(requests):5d} requests  {logged} values"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ from tqdm import tqdm # For fancy progress bars
 
 from src.model import Translator # Our model
 from src.data import get_data, create_mask, generate_square_subsequent_mask # Loading data and data preprocessing
+from src.metrics import MetricsLogger # Logging metrics to the run in the background
 from argparse import ArgumentParser # For args
 
 # Train on the GPU if possible
@@ -230,6 +231,10 @@ def main(opts):
     optim = torch.optim.Adam(model.parameters(), lr=opts.lr, betas=(0.9, 0.98), eps=1e-9)
 
     best_val_loss = 1e6
+
+    # Metrics are sent to the run by a background thread, so a slow
+    # platform API does not delay the next epoch
+    metrics_logger = MetricsLogger(run) if run is not None else None
     
     for idx, epoch in enumerate(range(1, opts.epochs+1)):
 
@@ -248,10 +253,14 @@ def main(opts):
 
         logger.info(f"Epoch: {epoch}\n\tTrain loss: {train_loss:.3f}\n\tVal loss: {val_loss:.3f}\n\tEpoch time = {epoch_time:.1f} seconds\n\tETA = {epoch_time*(opts.epochs-idx-1):.1f} seconds")
 
-        if run is not None:
+        if metrics_logger is not None:
             metrics = {"train_loss": train_loss, "val_loss": val_loss}
             logging.info(f"Logging metrics to run... : {metrics}")
-            run.log_metrics(metrics)
+            metrics_logger.log_metrics(metrics)
+
+    # Send the metrics still pending before returning
+    if metrics_logger is not None:
+        metrics_logger.close()
 
     return {
         "train_loss": train_loss,
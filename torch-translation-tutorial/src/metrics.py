@@ -0,0 +1,109 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Log metrics to a platform run from a background thread, so that the
+# training loop does not wait for the API. Values are buffered per metric
+# and sent in batches: every `flush_interval` seconds one call appends all
+# the pending values of each metric to the run.
+class MetricsLogger:
+    def __init__(self, run, flush_interval=5.0, max_pending=10000):
+        self.run = run
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending = defaultdict(list)
+        self._size = 0
+        self._logged = 0   # values received by log_metrics
+        self._done = 0     # values sent to the run, or dropped
+        self._dropped = 0
+        self._flush = False
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._worker = threading.Thread(target=self._loop, daemon=True)
+        self._worker.start()
+
+        # Flush what is left if the process exits without close()
+        atexit.register(self.close)
+
+    def log_metrics(self, metrics):
+        with self._cond:
+            if self._closed:
+                self._send({key: [value] for key, value in metrics.items()})
+                return
+
+            for key, value in metrics.items():
+                self._pending[key].append(value)
+            if self._size == 0:
+                self._cond.notify_all()
+            self._size += len(metrics)
+            self._logged += len(metrics)
+
+            # Bounded buffer: when the API cannot keep up, drop the oldest
+            # values instead of blocking training or growing without limit
+            while self._size > self.max_pending:
+                key = max(self._pending, key=lambda k: len(self._pending[k]))
+                self._pending[key].pop(0)
+                self._size -= 1
+                self._done += 1
+                self._dropped += 1
+
+    def log_metric(self, key, value):
+        self.log_metrics({key: value})
+
+    def flush(self):
+        # Send the pending values now and wait until they reach the run
+        with self._cond:
+            target = self._logged
+            self._flush = True
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self._done >= target or not self._worker.is_alive())
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._size or self._closed)
+                # Collect more values until the interval ends or a flush
+                self._cond.wait_for(lambda: self._flush or self._closed, self.flush_interval)
+                batch, self._pending = self._pending, defaultdict(list)
+                size, self._size = self._size, 0
+                self._flush = False
+                dropped, self._dropped = self._dropped, 0
+                closed = self._closed
+
+            if dropped:
+                logger.warning(f"Dropped {dropped} metric values, the run API is too slow")
+            if batch:
+                self._send(batch)
+
+            with self._cond:
+                self._done += size
+                self._cond.notify_all()
+                if closed and self._size == 0:
+                    return
+
+    def _send(self, batch):
+        try:
+            # Lists are appended to the metrics already logged in the run
+            self.run.log_metrics({key: list(values) for key, values in batch.items()})
+        except Exception as e:
+            logger.warning(f"Could not log metrics to the run: {e}")